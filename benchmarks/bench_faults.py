@@ -0,0 +1,187 @@
+"""故障场景测试
+
+用 :mod:`benchmarks.mirror` 的故障注入模式模拟不稳定的代理和资源站，记录更新器的下载和修复流程
+在各故障场景下的成功与否、成功所需时间、请求次数，以及浪费的字节数（服务器发送的字节数减去有效字节数）。
+服务器发送的字节数包括客户端提前关闭的连接中已经写入套接字缓冲区的部分，
+因此无故障时也会因为探测请求、代理测速等产生少量浪费。
+
+下载场景按 CLI 的方式执行：下载失败时保留已下载的部分重新运行，哈希不一致时删除更新包重新下载，
+最多尝试 ``--attempts`` 次。
+
+用法（在仓库根目录运行）::
+
+    python -m benchmarks.bench_faults --output faults.json
+    python -m benchmarks.bench_faults --scenario download_stall --scenario repair_reset
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks.bench_suite import _commit
+from benchmarks.mirror import MB, Fault, MirrorServer, Release, build_release, use_mirror
+
+
+@dataclasses.dataclass
+class Scenario:
+    """故障场景"""
+    kind: str
+    """ download 或 repair """
+    faults: dict[str, Fault] = dataclasses.field(default_factory=dict)
+    """ 路由名 → 故障 """
+    proxys: list[str] = dataclasses.field(default_factory=lambda: [""])
+    """ 下载使用的代理，代理名会替换为本地模拟代理，空字符串表示直连 """
+    description: str = ""
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "download_baseline": Scenario("download", description="无故障，直连"),
+    "download_latency": Scenario("download", {"github": Fault(latency=0.5)}, description="每个请求延迟 0.5 秒"),
+    "download_slow_proxy": Scenario("download", {"proxy/slow": Fault(latency=0.3, bandwidth=2 * MB)},
+                                    ["slow", "fast"], "两个代理，其中一个慢且限速 2 MB/s"),
+    "download_stall": Scenario("download", {"proxy/stall": Fault(stall_after=4 * MB, stall=3600)},
+                               ["stall", "fast"], "第一个代理传输 4 MB 后停止响应"),
+    "download_reset": Scenario("download", {"github": Fault(reset_after=4 * MB, times=2)},
+                               description="前两次请求在 4 MB 后断开连接"),
+    "download_truncated": Scenario("download", {"proxy/short": Fault(extra_length=1024)},
+                                   ["short", "fast"], "第一个代理声明的 Content-Length 比实际内容长"),
+    "download_corrupt": Scenario("download", {"proxy/corrupt": Fault(corrupt_at=1024)},
+                                 ["corrupt", "fast"], "第一个代理返回的内容有一个字节损坏"),
+    "repair_baseline": Scenario("repair", description="无故障"),
+    "repair_latency": Scenario("repair", {"resource": Fault(latency=0.5)}, description="每个请求延迟 0.5 秒"),
+    "repair_503": Scenario("repair", {"resource": Fault(status=503, times=5)}, description="前五次请求返回 503"),
+    "repair_reset": Scenario("repair", {"resource": Fault(reset_after=1024, times=5)},
+                             description="前五次请求在 1 KB 后断开连接"),
+    "repair_corrupt": Scenario("repair", {"resource": Fault(corrupt_at=0, times=5)},
+                               description="前五次请求返回的内容损坏，哈希校验失败不重试，预期失败"),
+    "repair_gzip": Scenario("repair", {"resource": Fault(gzip=True)}, description="资源站以 gzip 压缩响应"),
+}
+
+
+async def _download(server: MirrorServer, scenario: Scenario, attempts: int, timeout: int) -> dict:
+    from src import settings
+    from src.const import TEMP_DOWNLOAD_FILE, DOWNLOADING_FILE
+    from src.util import download_update_async, get_remote_version
+
+    settings.set_proxys([server.proxy(name) if name else "" for name in scenario.proxys])
+    TEMP_DOWNLOAD_FILE.unlink(missing_ok=True)
+    DOWNLOADING_FILE.unlink(missing_ok=True)
+    version_data = (await get_remote_version()).data
+    server.reset_stats()
+
+    started = time.perf_counter()
+    errors = []
+    for attempt in range(1, attempts + 1):
+        try:
+            digest = await download_update_async(version_data, timeout=timeout)
+        except Exception as e:
+            errors.append(str(e) or repr(e))
+            continue
+        if digest == server.release.sha256:
+            return {"success": True, "seconds": round(time.perf_counter() - started, 3), "attempts": attempt,
+                    "errors": errors}
+        errors.append("哈希校验失败")
+        TEMP_DOWNLOAD_FILE.unlink(missing_ok=True)
+        DOWNLOADING_FILE.unlink(missing_ok=True)
+    return {"success": False, "seconds": round(time.perf_counter() - started, 3), "attempts": attempts,
+            "errors": errors}
+
+
+async def _repair(server: MirrorServer, app: Path, files: dict[str, str]) -> dict:
+    from src.repair import repair_files
+
+    for filename in files:
+        (app / filename).unlink(missing_ok=True)
+    server.reset_stats()
+
+    started = time.perf_counter()
+    failed = []
+    attempts = 0
+    async for result in repair_files(files, app):
+        attempts += result.attempts
+        if not result.ok:
+            failed.append(f"{result.filename}: {result.error}")
+    return {"success": not failed, "seconds": round(time.perf_counter() - started, 3), "attempts": attempts,
+            "errors": failed}
+
+
+async def _run(release: Release, app: Path, names: list[str], attempts: int, timeout: int,
+               repair_files_count: int) -> dict:
+    server = MirrorServer(release, faults={})
+    await server.start()
+    use_mirror(server.urls())
+    from src.network import close_session
+
+    broken = {filename: release.manifest[filename] for filename in list(release.manifest)[:repair_files_count]}
+    broken_size = sum((release.root / filename).stat().st_size for filename in broken)
+    results = {}
+    try:
+        for name in names:
+            scenario = SCENARIOS[name]
+            server.faults = scenario.faults
+            if scenario.kind == "download":
+                result = await _download(server, scenario, attempts, timeout)
+                useful = release.size
+            else:
+                result = await _repair(server, app, broken)
+                useful = broken_size
+            sent = sum(server.bytes_sent.values())
+            result.update(description=scenario.description, requests=dict(server.requests), bytes_sent=sent,
+                          bytes_wasted=max(sent - useful, 0) if result["success"] else sent)
+            results[name] = result
+            print(f"{name:>20}: {'成功' if result['success'] else '失败'} {result['seconds']:8.3f}s, "
+                  f"尝试 {result['attempts']} 次, 浪费 {result['bytes_wasted'] / MB:7.2f} MB", file=sys.stderr)
+    finally:
+        await close_session()
+        await server.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="故障场景测试")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="只运行指定场景，可以多次指定")
+    parser.add_argument("--files", type=int, default=200, help="文件数")
+    parser.add_argument("--size", type=int, default=32, help="所有文件的总大小(MB)")
+    parser.add_argument("--repair-files", type=int, default=20, help="修复场景中需要修复的文件数")
+    parser.add_argument("--attempts", type=int, default=3, help="下载场景的最大尝试次数")
+    parser.add_argument("--timeout", type=int, default=5, help="下载的读取超时时间(秒)")
+    parser.add_argument("--output", type=Path, help="结果 JSON 的保存路径，默认只打印")
+    args = parser.parse_args()
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = Path(temp_dir) / "app"
+        (app / "data").mkdir(parents=True)
+        # 更新器以程序所在目录为安装目录，并从工作目录读取 version.json
+        sys.argv[0] = str(app / "SRAUpdater.exe")
+        (app / "version.json").write_text(json.dumps({"version": "0.0.1", "Proxys": [""], "PackageCacheSize": 0}),
+                                          encoding="utf-8")
+        cwd = os.getcwd()
+        os.chdir(app)
+        try:
+            release = build_release(Path(temp_dir) / "mirror", files=args.files, size=args.size * MB)
+            measured = asyncio.run(_run(release, app, args.scenario or list(SCENARIOS), args.attempts, args.timeout,
+                                        args.repair_files))
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        "commit": _commit(),
+        "params": {"files": args.files, "size_mb": args.size, "package_bytes": release.size,
+                   "attempts": args.attempts, "timeout": args.timeout},
+        "results": measured,
+    }
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""启动导入耗时基准测试
+
+用 ``python -X importtime main.py <子命令>`` 运行真实的命令行入口，统计各子命令启动时导入模块的总耗时和模块数，
+并检查：
+
+- 每个子命令都没有导入不该导入的模块（例如 ``settings`` 不应加载 aiohttp/psutil/textual）
+- 导入耗时和模块数没有超出 ``BUDGETS`` 中的预算
+
+命令在临时目录中离线运行：第一次访问网络时立即结束进程，因此统计的是命令发出第一个请求之前（不访问网络的命令
+则是整个运行期间）的导入，不会真的下载或修改任何文件。不带子命令时启动界面，同样在界面挂载后发出第一个请求时结束。
+
+任一检查不通过时以退出码 1 结束，可以在打包前或 CI 中运行。
+
+用法（在仓库根目录运行）::
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --rounds 10 --scenario settings
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS: dict[str, tuple[list[str], list[str]]] = {
+    # 场景: (命令行参数, 不应导入的模块)
+    "settings": (["settings", "--show-only"],
+                 ["aiohttp", "psutil", "textual", "win32crypt", "rich.progress", "rich.markdown"]),
+    "check": (["check"], ["textual", "rich.markdown", "src.extract", "src.staging"]),
+    "update": (["update"], ["textual"]),
+    "rollback": (["rollback"], ["textual", "rich.progress", "rich.markdown"]),
+    "tui": ([], []),
+}
+
+BUDGETS: dict[str, tuple[float, int]] = {
+    # 场景: (导入总耗时上限(毫秒), 模块数上限)
+    "settings": (300, 330),
+    "check": (550, 500),
+    "update": (600, 600),
+    "rollback": (550, 490),
+    "tui": (900, 780),
+}
+""" 导入预算，约为参考环境测量值的两倍耗时和 1.2 倍模块数，导入了新的依赖或启动路径变重时需要相应调整 """
+
+_DRIVER = """
+import os, runpy, sys
+
+def offline(event, args):
+    if event in ("socket.getaddrinfo", "socket.connect"):
+        sys.stderr.flush()
+        os._exit(0)
+
+sys.addaudithook(offline)
+sys.path.insert(0, {root!r})
+sys.argv = ["main.py", *sys.argv[1:]]
+runpy.run_path({main!r}, run_name="__main__")
+"""
+""" 以 ``__main__`` 运行 main.py，访问网络时结束进程 """
+
+
+def measure(args: list[str], cwd: Path) -> tuple[int, set[str]]:
+    """在新的解释器中离线运行 main.py
+
+    Returns:
+        tuple[int, set[str]]: 导入总耗时(微秒)，以及导入的所有模块
+    """
+    code = _DRIVER.format(root=str(ROOT), main=str(ROOT / "main.py"))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *args], cwd=cwd,
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, encoding="utf-8",
+                            errors="replace", timeout=60)
+    total = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        total += int(self_us)
+        imported.add(name.strip())
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"main.py {' '.join(args)} 退出码 {result.returncode}:\n" + "\n".join(errors[-10:]))
+    return total, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时基准测试")
+    parser.add_argument("--rounds", type=int, default=5, help="每个子命令的测试次数，取最好成绩")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="只测试指定场景，可以多次指定")
+    parser.add_argument("--output", type=Path, help="结果 JSON 的保存路径，默认只打印")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cwd = Path(temp_dir)
+        (cwd / "data").mkdir()
+        (cwd / "version.json").write_text(json.dumps({"version": "0.0.1", "Proxys": [""]}), encoding="utf-8")
+        (cwd / "data" / "globals.json").write_text("{}", encoding="utf-8")
+        for name in args.scenario or list(SCENARIOS):
+            command, forbidden = SCENARIOS[name]
+            best, imported = min((measure(command, cwd) for _ in range(args.rounds)), key=lambda r: r[0])
+            results[name] = {"time_us": best, "modules": len(imported)}
+            time_budget, module_budget = BUDGETS[name]
+            line = (f"{name:>8}: {best / 1000:7.1f} ms / {time_budget:.0f} ms, "
+                    f"{len(imported):4d} / {module_budget} 个模块")
+
+            unexpected = sorted(module for module in forbidden if module in imported)
+            if unexpected:
+                failed = True
+                line += f"  ✗ 导入了 {', '.join(unexpected)}"
+            if best > time_budget * 1000 or len(imported) > module_budget:
+                failed = True
+                line += "  ✗ 超出预算"
+            print(line)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4), encoding="utf-8")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""端到端基准测试
+
+在临时目录中模拟一次安装，所有网络请求都发往 :mod:`benchmarks.mirror` 的本地镜像服务器，依次测量：
+
+- download: 下载完整更新包（分段下载、边写边算哈希）
+- hash: 单线程计算安装目录中所有文件的 sha256
+- extract_cold: 解压更新包到空目录并校验
+- extract_warm: 再次解压，跳过未变化的文件
+- check_full: 忽略哈希缓存的完整性检查
+- check_warm: 使用哈希缓存的完整性检查
+- repair: 删除部分文件后从资源站修复
+
+每项取多次测试中的最好成绩，结果以 JSON 输出，可以用 ``--compare`` 与其他提交的结果比较。
+
+用法（在仓库根目录运行）::
+
+    python -m benchmarks.bench_suite --files 500 --size 128 --output before.json
+    python -m benchmarks.bench_suite --files 500 --size 128 --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks.mirror import MB, MirrorServer, Release, build_release, use_mirror
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def _measure(rounds: int, run, setup=None, size: int = 0) -> dict:
+    """多次运行 run，返回最短耗时，size 不为 0 时同时给出吞吐量(MB/s)"""
+    best = float("inf")
+    for _ in range(rounds):
+        if setup is not None:
+            await setup()
+        started = time.perf_counter()
+        await run()
+        best = min(best, time.perf_counter() - started)
+    result = {"seconds": round(best, 4)}
+    if size:
+        result["mb_per_s"] = round(size / MB / best, 2)
+    return result
+
+
+def _age_files(root: Path, filenames) -> None:
+    """将文件修改时间改到一小时前，模拟已安装一段时间的文件（刚写入的文件不会写入哈希缓存）"""
+    past = time.time() - 3600
+    for filename in filenames:
+        os.utime(root / filename, (past, past))
+
+
+async def _run(release: Release, app: Path, rounds: int, repair_ratio: float) -> dict:
+    server = MirrorServer(release)
+    await server.start()
+    use_mirror(server.urls())
+
+    from src.const import TEMP_DOWNLOAD_DIR, HASH_CACHE_FILE
+    from src.extract import extract_zip
+    from src.integrity import HashCache, check_files, hash_file
+    from src.network import close_session
+    from src.repair import repair_files
+    from src.util import download_update_async, get_remote_version
+
+    manifest = release.manifest
+    files_size = release.files_size
+    results = {}
+    try:
+        version_data = (await get_remote_version()).data
+
+        async def clear_download():
+            shutil.rmtree(TEMP_DOWNLOAD_DIR, ignore_errors=True)
+
+        async def download():
+            assert await download_update_async(version_data) == release.sha256
+
+        results["download"] = await _measure(rounds, download, clear_download, release.size)
+
+        async def hash_all():
+            for filename in manifest:
+                hash_file(release.root / filename)
+
+        results["hash"] = await _measure(rounds, hash_all, size=files_size)
+
+        async def clear_install():
+            for filename in manifest:
+                (app / filename).unlink(missing_ok=True)
+            HASH_CACHE_FILE.unlink(missing_ok=True)
+
+        async def extract(skip_unchanged: bool = False):
+            report = await extract_zip(release.package, app, manifest=manifest, skip_unchanged=skip_unchanged)
+            assert report.ok, report
+
+        results["extract_cold"] = await _measure(rounds, extract, clear_install, files_size)
+        results["extract_warm"] = await _measure(rounds, lambda: extract(True), size=files_size)
+
+        _age_files(app, manifest)
+
+        async def check(full: bool):
+            async for result in check_files(manifest, app, cache=HashCache.load(), full=full):
+                assert result.ok, result
+
+        results["check_full"] = await _measure(rounds, lambda: check(True), size=files_size)
+        results["check_warm"] = await _measure(rounds, lambda: check(False), size=files_size)
+
+        broken = list(manifest)[::max(1, round(1 / repair_ratio))]
+        broken_size = sum((release.root / filename).stat().st_size for filename in broken)
+
+        async def break_files():
+            for filename in broken:
+                (app / filename).unlink(missing_ok=True)
+
+        async def repair():
+            async for result in repair_files({filename: manifest[filename] for filename in broken}, app):
+                assert result.ok, result
+
+        results["repair"] = await _measure(rounds, repair, break_files, broken_size)
+        results["repair"]["files"] = len(broken)
+    finally:
+        await close_session()
+        await server.close()
+    results["requests"] = server.requests
+    return results
+
+
+def _compare(results: dict, baseline: dict) -> None:
+    """打印与基线结果的耗时对比"""
+    print(f"与 {baseline.get('commit') or '基线'} 比较:")
+    for name, result in results["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not isinstance(result, dict) or "seconds" not in result or not old or "seconds" not in old:
+            continue
+        change = (result["seconds"] - old["seconds"]) / old["seconds"] * 100
+        print(f"{name:>14}: {old['seconds']:8.3f}s → {result['seconds']:8.3f}s ({change:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准测试")
+    parser.add_argument("--files", type=int, default=500, help="文件数")
+    parser.add_argument("--size", type=int, default=128, help="所有文件的总大小(MB)")
+    parser.add_argument("--rounds", type=int, default=3, help="每项的测试次数，取最好成绩")
+    parser.add_argument("--repair-ratio", type=float, default=0.1, help="修复测试中删除的文件比例")
+    parser.add_argument("--output", type=Path, help="结果 JSON 的保存路径，默认只打印")
+    parser.add_argument("--compare", type=Path, help="与此前保存的结果 JSON 比较")
+    args = parser.parse_args()
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = Path(temp_dir) / "app"
+        (app / "data").mkdir(parents=True)
+        # 更新器以程序所在目录为安装目录，并从工作目录读取 version.json
+        sys.argv[0] = str(app / "SRAUpdater.exe")
+        (app / "version.json").write_text(json.dumps({"version": "0.0.1", "Proxys": [""], "PackageCacheSize": 0}),
+                                          encoding="utf-8")
+        cwd = os.getcwd()
+        os.chdir(app)
+        try:
+            release = build_release(Path(temp_dir) / "mirror", files=args.files, size=args.size * MB)
+            measured = asyncio.run(_run(release, app, args.rounds, args.repair_ratio))
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"files": args.files, "size_mb": args.size, "rounds": args.rounds,
+                   "package_bytes": release.size},
+        "results": measured,
+    }
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        _compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
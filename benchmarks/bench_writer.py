@@ -0,0 +1,106 @@
+"""下载写入路径基准测试
+
+对比两种写入方式从本地服务器下载同一文件的吞吐量，以及事件循环的最长停顿（界面卡顿）时间。
+两种方式都按 ``DOWNLOAD_CHUNK_SIZE`` 读取响应，只有写入方式不同：
+
+- inline: 旧实现，在事件循环中对每个数据块直接调用 f.write
+- writer: :class:`src.writer.FileWriter`，合并写入并在独立线程中写盘
+
+用法（在仓库根目录运行）::
+
+    python -m benchmarks.bench_writer --size 512
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from src.const import DOWNLOAD_CHUNK_SIZE
+from src.writer import FileWriter
+
+
+async def _serve(data: bytes) -> web.AppRunner:
+    async def handler(request):
+        response = web.StreamResponse(headers={"Content-Length": str(len(data))})
+        await response.prepare(request)
+        view = memoryview(data)
+        for i in range(0, len(data), 256 * 1024):
+            await response.write(view[i:i + 256 * 1024])
+        return response
+
+    app = web.Application()
+    app.router.add_get("/file", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+async def _measure_lag(stop: asyncio.Event) -> float:
+    """每毫秒唤醒一次，记录事件循环的最长停顿"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, time.perf_counter() - started - 0.001)
+    return worst
+
+
+async def download_inline(url: str, path: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            with open(path, "wb") as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+
+async def download_writer(url: str, path: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            writer = FileWriter(path, int(response.headers["Content-Length"]))
+            position = 0
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await writer.write(position, chunk)
+                    position += len(chunk)
+            finally:
+                await writer.close()
+
+
+async def _run(size_mb: int, rounds: int) -> None:
+    data = os.urandom(size_mb * 1024 * 1024)
+    runner = await _serve(data)
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}/file"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "download.bin")
+        for name, func in (("inline", download_inline), ("writer", download_writer)):
+            best_time, best_lag = float("inf"), float("inf")
+            for _ in range(rounds):
+                stop = asyncio.Event()
+                lag_task = asyncio.create_task(_measure_lag(stop))
+                started = time.perf_counter()
+                await func(url, path)
+                elapsed = time.perf_counter() - started
+                stop.set()
+                best_time = min(best_time, elapsed)
+                best_lag = min(best_lag, await lag_task)
+                assert os.path.getsize(path) == len(data)
+            print(f"{name:>6}: {size_mb / best_time:8.1f} MB/s, 事件循环最长停顿 {best_lag * 1000:6.1f} ms")
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载写入路径基准测试")
+    parser.add_argument("--size", type=int, default=256, help="测试文件大小(MB)")
+    parser.add_argument("--rounds", type=int, default=3, help="每种方式的测试次数，取最好成绩")
+    args = parser.parse_args()
+    asyncio.run(_run(args.size, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""本地镜像服务器
+
+在本机模拟更新器访问的所有远程服务，基准测试无需访问 gitee、Mirror酱 和 GitHub 代理：
+
+- ``VERSION_URL``: Mirror酱 版本接口
+- ``API_URL``/``HASH_URL``/``ANNOUNCEMENT_URL``: gitee 上的 api.json、哈希清单和公告
+- ``GITHUB_URL``: GitHub Release 中的更新包，支持 Range/If-Range
+- ``RESOURCE_URL``: 单个文件的资源站
+
+此外 ``/proxy/{name}/{url}`` 模拟 GitHub 代理，``name`` 可以任意取，用于区分不同的代理。
+
+提供的更新包和安装目录由 :func:`build_release` 按指定的文件数和总大小生成，内容固定（由随机种子决定）。
+传入 ``faults`` 时进入故障注入模式，可以为每个路由（或每个代理）单独注入延迟、限速、中途停顿、
+连接重置、错误的 Content-Length、损坏的数据和 gzip 压缩的响应，见 :class:`Fault`。
+
+单独运行时启动服务器并打印各链接，用于手动测试（在仓库根目录运行）::
+
+    python -m benchmarks.mirror --files 200 --size 64
+    python -m benchmarks.mirror --fault github:latency=1,bandwidth=1048576
+"""
+import argparse
+import asyncio
+import dataclasses
+import gzip
+import hashlib
+import json
+import random
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from aiohttp import web
+
+MB = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclasses.dataclass
+class Fault:
+    """注入到一个路由的故障，各项可以组合"""
+    latency: float = 0
+    """ 发送响应头前的延迟(秒) """
+    bandwidth: int = 0
+    """ 带宽上限(字节/秒)，为 0 时不限速 """
+    stall_after: int = -1
+    """ 发送该字节数后停顿 ``stall`` 秒，为 -1 时不停顿 """
+    stall: float = 0
+    """ 停顿时长(秒) """
+    reset_after: int = -1
+    """ 发送该字节数后直接断开连接，为 -1 时不断开 """
+    extra_length: int = 0
+    """ Content-Length 比实际内容多出的字节数，发送完实际内容后断开连接 """
+    corrupt_at: int = -1
+    """ 将文件中该偏移处的字节取反，为 -1 时不损坏 """
+    status: int = 0
+    """ 直接返回该状态码，为 0 时正常响应 """
+    gzip: bool = False
+    """ 请求接受 gzip 时以 ``Content-Encoding: gzip`` 发送完整内容（忽略 Range），模拟压缩响应的 CDN """
+    times: int = 0
+    """ 只对前几次请求注入故障，为 0 时对所有请求注入 """
+
+    @classmethod
+    def parse(cls, text: str) -> "Fault":
+        """从 ``latency=1,bandwidth=1048576`` 形式的文本解析"""
+        fault = cls()
+        for item in filter(None, text.split(",")):
+            name, _, value = item.partition("=")
+            field_type = type(getattr(fault, name.strip()))
+            setattr(fault, name.strip(), field_type(value))
+        return fault
+
+
+@dataclasses.dataclass
+class Release:
+    """模拟的发布版本"""
+    version: str
+    """ 版本号，例如 v9.9.9 """
+    root: Path
+    """ 解压后的安装目录 """
+    package: Path
+    """ 更新包 """
+    manifest: dict[str, str]
+    """ 哈希清单，文件名 → sha256 """
+    sha256: str
+    """ 更新包的 sha256 """
+    size: int
+    """ 更新包的字节数 """
+
+    @property
+    def files_size(self) -> int:
+        """安装目录中所有文件的总字节数"""
+        return sum((self.root / filename).stat().st_size for filename in self.manifest)
+
+
+def build_release(directory: Path, version: str = "v9.9.9", files: int = 200, size: int = 64 * MB,
+                  seed: int = 0) -> Release:
+    """生成模拟的安装目录和更新包
+
+    文件大小按对数均匀分布，与真实版本中大量小文件、少量大文件的情况相近，约一半文件可压缩。
+
+    Args:
+        directory: 输出目录
+        version: 版本号
+        files: 文件数
+        size: 所有文件的总字节数（近似值）
+        seed: 随机种子，相同参数生成的内容相同
+
+    Returns:
+        Release: 生成的发布版本
+    """
+    rng = random.Random(seed)
+    weights = [2 ** rng.uniform(0, 12) for _ in range(files)]
+    scale = size / sum(weights)
+    root = directory / "release"
+    manifest = {}
+    for index, weight in enumerate(weights):
+        filename = f"{('bin', 'assets', 'assets/images', 'data')[index % 4]}/file{index:05d}.dat"
+        length = max(1, int(weight * scale))
+        if index % 2:
+            content = rng.randbytes(length)
+        else:
+            content = (rng.randbytes(64) * (length // 64 + 1))[:length]
+        path = root / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        manifest[filename] = hashlib.sha256(content).hexdigest()
+
+    package = directory / f"StarRailAssistant_{version}.zip"
+    with zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for filename in manifest:
+            zf.write(root / filename, filename)
+    digest = hashlib.sha256(package.read_bytes()).hexdigest()
+    return Release(version=version, root=root, package=package, manifest=manifest, sha256=digest,
+                   size=package.stat().st_size)
+
+
+class MirrorServer:
+    """模拟远程服务的本地 HTTP 服务器"""
+
+    def __init__(self, release: Release, faults: dict[str, Fault] | None = None):
+        """
+        Args:
+            release: 提供的发布版本
+            faults: 路由名 → 注入的故障，代理的路由名为 ``proxy/{name}``。
+                为 None 时直接用 :class:`aiohttp.web.FileResponse` 发送文件；
+                否则由服务器自己分块发送所有响应（包括没有故障的路由），以便注入故障并统计发送的字节数
+        """
+        self.release = release
+        self.faults = faults
+        self.requests: dict[str, int] = {}
+        """ 各路由收到的请求数 """
+        self.bytes_sent: dict[str, int] = {}
+        """ 各路由发送的响应体字节数，仅故障注入模式下统计 """
+        self._app = web.Application(middlewares=[self._count])
+        self._app.router.add_get("/mirrorchyan/latest", self._version, name="version")
+        self._app.router.add_get("/gitee/api.json", self._api, name="api")
+        self._app.router.add_get("/gitee/hash.json", self._hash, name="hash")
+        self._app.router.add_get("/gitee/announcement.json", self._announcement, name="announcement")
+        self._app.router.add_get("/github/releases/download/{version}/{name}", self._package, name="github")
+        self._app.router.add_get("/proxy/{proxy}/{target:.+}", self._proxy, name="proxy")
+        self._app.router.add_get("/resource/{filename:.+}", self._resource, name="resource")
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """启动服务器，端口为 0 时使用随机端口"""
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def urls(self) -> dict[str, str]:
+        """与 :mod:`src.const` 中同名常量格式相同的本地链接"""
+        base = self.base_url
+        return {
+            "VERSION_URL": base + "/mirrorchyan/latest?current_version=v{version}&cdk={cdk}&channel={channel}",
+            "API_URL": base + "/gitee/api.json",
+            "HASH_URL": base + "/gitee/hash.json",
+            "ANNOUNCEMENT_URL": base + "/gitee/announcement.json",
+            "GITHUB_URL": base + "/github/releases/download/{version}/StarRailAssistant_{version}.zip",
+            "RESOURCE_URL": base + "/resource/{filename}",
+        }
+
+    def proxy(self, name: str) -> str:
+        """名为 name 的模拟代理，格式与设置中的代理前缀相同"""
+        return f"{self.base_url}/proxy/{name}/"
+
+    def reset_stats(self) -> None:
+        """清空请求数和发送字节数的统计"""
+        self.requests.clear()
+        self.bytes_sent.clear()
+
+    @staticmethod
+    def _route(request: web.Request) -> str:
+        route = request.match_info.route.name or "unknown"
+        if route == "proxy":
+            return f"proxy/{request.match_info['proxy']}"
+        return route
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler):
+        route = self._route(request)
+        self.requests[route] = self.requests.get(route, 0) + 1
+        return await handler(request)
+
+    async def _json(self, request: web.Request, data) -> web.StreamResponse:
+        if self.faults is None:
+            return web.json_response(data)
+        return await self._stream(request, json.dumps(data).encode(), "application/json")
+
+    async def _file(self, request: web.Request, path: Path) -> web.StreamResponse:
+        if self.faults is None:
+            return web.FileResponse(path)
+        stat = path.stat()
+        return await self._stream(request, path.read_bytes(), "application/octet-stream",
+                                  f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"')
+
+    def _fault(self, route: str) -> Fault | None:
+        fault = self.faults.get(route)
+        if fault is None or (fault.times and self.requests.get(route, 0) > fault.times):
+            return None
+        return fault
+
+    async def _stream(self, request: web.Request, data: bytes, content_type: str,
+                      etag: str = "") -> web.StreamResponse:
+        """分块发送响应体，支持单个 Range 和 If-Range，并按路由注入故障"""
+        route = self._route(request)
+        fault = self._fault(route) or Fault()
+        if fault.latency:
+            await asyncio.sleep(fault.latency)
+        if fault.status:
+            return web.Response(status=fault.status)
+
+        start, end, status = 0, len(data) - 1, 200
+        headers = {"Content-Type": content_type, "Accept-Ranges": "bytes"}
+        if etag:
+            headers["ETag"] = etag
+        requested = request.http_range
+        if fault.gzip and "gzip" in request.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            start, end = 0, len(data) - 1
+            headers["Content-Encoding"] = "gzip"
+        elif request.headers.get("Range") and request.headers.get("If-Range", etag) == etag:
+            start = requested.start or 0
+            end = min((requested.stop or len(data)) - 1, len(data) - 1)
+            if start > end:
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{len(data)}"})
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        body = bytearray(data[start:end + 1])
+        if start <= fault.corrupt_at <= end:
+            body[fault.corrupt_at - start] ^= 0xFF
+        headers["Content-Length"] = str(len(body) + fault.extra_length)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        try:
+            await self._send(request, response, route, bytes(body), fault)
+        except ConnectionError:
+            # 客户端已放弃（例如代理测速结束或读取超时）
+            pass
+        return response
+
+    async def _send(self, request: web.Request, response: web.StreamResponse, route: str, body: bytes,
+                    fault: Fault) -> None:
+        await response.prepare(request)
+        sent = 0
+        stalled = False
+        while sent < len(body):
+            limit = len(body)
+            if fault.reset_after >= 0:
+                limit = min(limit, fault.reset_after)
+            if fault.stall_after >= 0 and not stalled:
+                limit = min(limit, fault.stall_after)
+            if sent >= limit:
+                if fault.reset_after >= 0 and sent >= fault.reset_after:
+                    break
+                stalled = True
+                await asyncio.sleep(fault.stall)
+                continue
+            chunk = body[sent:min(sent + CHUNK_SIZE, limit)]
+            started = time.monotonic()
+            await response.write(chunk)
+            sent += len(chunk)
+            self.bytes_sent[route] = self.bytes_sent.get(route, 0) + len(chunk)
+            if fault.bandwidth:
+                await asyncio.sleep(max(len(chunk) / fault.bandwidth - (time.monotonic() - started), 0))
+        if sent < len(body) or fault.extra_length:
+            # 连接重置，或者内容比声明的 Content-Length 短
+            request.transport.close()
+            return
+        await response.write_eof()
+
+    async def _version(self, request: web.Request) -> web.StreamResponse:
+        release = self.release
+        return await self._json(request, {"code": 0, "msg": "success", "data": {
+            "version_name": release.version,
+            "url": "",
+            "sha256": release.sha256,
+            "channel": request.query.get("channel", "stable"),
+            "filesize": release.size,
+            "release_note": "本地镜像服务器生成的测试版本",
+        }})
+
+    async def _api(self, request: web.Request) -> web.StreamResponse:
+        return await self._json(request, {"version": self.release.version, "sha256": self.release.sha256})
+
+    async def _hash(self, request: web.Request) -> web.StreamResponse:
+        return await self._json(request, self.release.manifest)
+
+    async def _announcement(self, request: web.Request) -> web.StreamResponse:
+        return await self._json(request, {"Announcement": [], "Proxys": [""]})
+
+    async def _package(self, request: web.Request) -> web.StreamResponse:
+        if request.match_info["version"] != self.release.version:
+            raise web.HTTPNotFound()
+        return await self._file(request, self.release.package)
+
+    async def _proxy(self, request: web.Request) -> web.StreamResponse:
+        if not request.match_info["target"].endswith(self.release.package.name):
+            raise web.HTTPNotFound()
+        return await self._file(request, self.release.package)
+
+    async def _resource(self, request: web.Request) -> web.StreamResponse:
+        filename = request.match_info["filename"]
+        if filename not in self.release.manifest:
+            raise web.HTTPNotFound()
+        return await self._file(request, self.release.root / filename)
+
+
+def use_mirror(urls: dict[str, str]) -> None:
+    """让更新器访问本地镜像服务器
+
+    必须在导入 :mod:`src.const` 以外的其他 ``src`` 模块之前调用，它们在导入时复制了这些常量。
+    """
+    import src.const
+    for name, url in urls.items():
+        setattr(src.const, name, url)
+
+
+async def _serve(files: int, size: int, faults: dict[str, Fault] | None) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        release = build_release(Path(temp_dir), files=files, size=size * MB)
+        server = MirrorServer(release, faults)
+        await server.start()
+        print(json.dumps(server.urls(), indent=4))
+        print(f"更新包: {release.size} 字节, sha256 {release.sha256}，按 Ctrl+C 退出")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地镜像服务器")
+    parser.add_argument("--files", type=int, default=200, help="文件数")
+    parser.add_argument("--size", type=int, default=64, help="所有文件的总大小(MB)")
+    parser.add_argument("--fault", action="append", default=[], metavar="ROUTE:FAULT",
+                        help="注入故障，例如 github:latency=1,bandwidth=1048576，可以多次指定")
+    args = parser.parse_args()
+    faults = None
+    if args.fault:
+        faults = {route: Fault.parse(text) for route, _, text in (item.partition(":") for item in args.fault)}
+    try:
+        asyncio.run(_serve(args.files, args.size, faults))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
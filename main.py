@@ -1,44 +1,17 @@
 import argparse
 import asyncio
-from typing import Iterable
+import multiprocessing
+import sys
 
 from loguru import logger
-from textual.app import App, SystemCommand
-from textual.screen import Screen
 
-from src.cli import SRACLI
-from src.component import HomeScreen, SettingsScreen, IntegrityScreen
+from src import tracing
 from src.const import VERSION, AUTHOR
 
+# 各子命令只导入自己用到的模块（见 run_command），未指定命令时才加载界面，缩短启动时间
 logger.remove(0)
 
 
-class SRAUpdaterApp(App):
-    TITLE = "SRA Updater"
-    SUB_TITLE = f"SRA 更新器 {VERSION}"
-    MODES = {
-        "home": HomeScreen,
-        "settings": SettingsScreen,
-        "integrity": IntegrityScreen,
-    }
-    DEFAULT_MODE = "home"
-
-    def get_system_commands(self, screen: Screen) -> Iterable[SystemCommand]:
-        yield SystemCommand("Change themes", "切换主题", self.action_change_theme)
-        yield SystemCommand("Open settings", "打开设置", lambda: self.switch_mode("settings"))
-        yield SystemCommand("Quit the application", "退出应用", self.action_quit)
-        if screen.query("HelpPanel"):
-            yield SystemCommand(
-                "Hide keys and help panel",
-                "隐藏帮助面板",
-                self.action_hide_help_panel,
-            )
-        else:
-            yield SystemCommand(
-                "Show keys and help panel",
-                "显示帮助面板",
-                self.action_show_help_panel,
-            )
 def parse_cli_args():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(
@@ -47,11 +20,22 @@ def parse_cli_args():
         epilog=f"作者: {AUTHOR}"
     )
 
-    # 子命令：支持 update/check/settings
+    parser.add_argument(
+        "--trace",
+        metavar="OUT.json",
+        help="记录各阶段耗时，以 Chrome trace-event 格式保存（可在 chrome://tracing 或 Perfetto 中打开）"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="同时用 cProfile 和 tracemalloc 分析，报告保存在追踪文件旁边（需要 --trace）"
+    )
+
+    # 子命令：支持 update/check/rollback/settings
     subparsers = parser.add_subparsers(
         dest="command",  # 存储选中的子命令
         required=False,  # 允许无命令（默认进入交互菜单）
-        help="可用命令：update（更新）、check（完整性检查）、settings（配置管理）, 对每个命令使用 -h 查看详细帮助"
+        help="可用命令：update（更新）、check（完整性检查）、rollback（回滚）、settings（配置管理）, 对每个命令使用 -h 查看详细帮助"
     )
 
     # 子命令 1: update（更新 SRA）
@@ -59,6 +43,16 @@ def parse_cli_args():
         "update",
         help="检查并更新 SRA 到最新版本"
     )
+    parser_update.add_argument(
+        "-f", "--full",
+        action="store_true",  # 带 -f 则跳过增量更新
+        help="始终下载完整更新包，不尝试只下载有变化的文件"
+    )
+    parser_update.add_argument(
+        "-s", "--staged",
+        action="store_true",  # 带 -s 则分阶段安装
+        help="在暂存目录中准备新版本，校验通过后再切换，并保留当前版本以便回滚"
+    )
 
     # 子命令 2: check（完整性检查）
     parser_check = subparsers.add_parser(
@@ -70,8 +64,19 @@ def parse_cli_args():
         action="store_true",  # 带 -r 则自动修复
         help="自动下载并修复异常文件（无需手动确认）"
     )
+    parser_check.add_argument(
+        "-f", "--full",
+        action="store_true",  # 带 -f 则忽略哈希缓存
+        help="忽略哈希缓存，重新计算所有文件的哈希"
+    )
 
-    # 子命令 3: settings（配置管理）
+    # 子命令 3: rollback（回滚）
+    subparsers.add_parser(
+        "rollback",
+        help="回滚到分阶段安装（update -s）前的版本"
+    )
+
+    # 子命令 4: settings（配置管理）
     parser_settings = subparsers.add_parser(
         "settings",
         help="查看或修改 SRA 配置（CDK/更新通道等）"
@@ -82,19 +87,39 @@ def parse_cli_args():
         help="仅显示当前配置，不进入交互修改模式"
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.profile and args.trace is None:
+        parser.error("--profile 需要同时指定 --trace")
+    return args
+
 
 async def main(args):
+    try:
+        await run_command(args)
+    finally:
+        # 只有发出过网络请求的命令才导入了 aiohttp，其余命令无需关闭会话
+        network = sys.modules.get("src.network")
+        if network is not None:
+            await network.close_session()
+
+
+async def run_command(args):
+    # 只在执行命令时导入 CLI，由各子命令按需导入其余模块，--help 和参数错误不会加载它们
+    from src.cli import SRACLI
     cli = SRACLI()
 
-    # 2. 根据参数执行对应命令
+    # 根据子命令调用 CLI 中对应的流程
     if args.command == "update":
-        # 执行更新流程：python sra_cli.py update
-        await cli.update_flow()
+        # 执行更新流程：python sra_cli.py update [-f] [-s]
+        await cli.update_flow(full=args.full, staged=args.staged)
 
     elif args.command == "check":
-        # 执行完整性检查：python sra_cli.py check [-r]
-        await cli.integrity_check(auto_repair=args.repair)
+        # 执行完整性检查：python sra_cli.py check [-r] [-f]
+        await cli.integrity_check(auto_repair=args.repair, full=args.full)
+
+    elif args.command == "rollback":
+        # 回滚版本：python sra_cli.py rollback
+        await cli.rollback()
 
     elif args.command == "settings":
         # 执行配置管理：python sra_cli.py settings [-s]
@@ -102,12 +127,15 @@ async def main(args):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后解压更新包时使用进程池
     args=parse_cli_args()
     try:
-        if args.command is not None:
-            asyncio.run(main(args))
-        else:
-            app = SRAUpdaterApp()
-            app.run()
+        with tracing.session(args.trace, args.profile):
+            if args.command is not None:
+                asyncio.run(main(args))
+            else:
+                from src.app import SRAUpdaterApp
+                app = SRAUpdaterApp()
+                app.run()
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,41 @@
+from typing import Iterable
+
+from textual.app import App, SystemCommand
+from textual.screen import Screen
+
+from src import settings
+from src.component import HomeScreen, SettingsScreen, IntegrityScreen
+from src.const import VERSION
+from src.network import close_session
+
+
+class SRAUpdaterApp(App):
+    TITLE = "SRA Updater"
+    SUB_TITLE = f"SRA 更新器 {VERSION}"
+    MODES = {
+        "home": HomeScreen,
+        "settings": SettingsScreen,
+        "integrity": IntegrityScreen,
+    }
+    DEFAULT_MODE = "home"
+
+    async def on_unmount(self) -> None:
+        settings.flush()
+        await close_session()
+
+    def get_system_commands(self, screen: Screen) -> Iterable[SystemCommand]:
+        yield SystemCommand("Change themes", "切换主题", self.action_change_theme)
+        yield SystemCommand("Open settings", "打开设置", lambda: self.switch_mode("settings"))
+        yield SystemCommand("Quit the application", "退出应用", self.action_quit)
+        if screen.query("HelpPanel"):
+            yield SystemCommand(
+                "Hide keys and help panel",
+                "隐藏帮助面板",
+                self.action_hide_help_panel,
+            )
+        else:
+            yield SystemCommand(
+                "Show keys and help panel",
+                "显示帮助面板",
+                self.action_show_help_panel,
+            )
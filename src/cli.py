@@ -1,30 +1,24 @@
-import asyncio
-import json
-import sys
 import time
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from packaging import version
 from rich import print as rprint
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.panel import Panel
-from rich.progress import (
-    Progress,
-    BarColumn,
-    TextColumn,
-    TimeRemainingColumn,
-    TaskProgressColumn,
-)
-from rich.prompt import Prompt
+from rich.prompt import Prompt, IntPrompt
 from rich.table import Table
 
 from src import settings
-from src.const import APP_PATH, VERSION, TEMP_DOWNLOAD_FILE, HASH_URL, ERROR_REMARK_DICT, ANNOUNCEMENT_URL
-from src.util import (
-    get_local_version, download_update_async, get_remote_version,
-    hash_check, Castorice, get, hash_calculate, download_file_async
-)
+from src.const import APP_PATH, VERSION, TEMP_DOWNLOAD_FILE, HASH_URL, ERROR_REMARK_DICT, ANNOUNCEMENT_URL, \
+    DOWNLOADING_FILE
+from src.progress import ProgressReporter, ProgressEvent
+from src.tracing import span, traced
+
+if TYPE_CHECKING:
+    from src.staging import StagedInstall
+
+# 网络、解压、进度条等较重的模块在用到它们的方法中导入，
+# 这样 settings 等子命令不会加载 aiohttp/psutil，见 benchmarks/bench_import_time.py
 
 # -------------------------- 1. 初始化 Rich 控制台（全局单例） --------------------------
 console = Console(highlight=False)  # highlight=False 避免自动高亮文本
@@ -35,6 +29,8 @@ class SRACLI:
         self.local_version = None
         self.version_response = None  # 远程版本信息
         self.inconsistent_files = []  # 完整性检查不通过的文件
+        self.hash_dict = {}  # 完整性检查使用的远程哈希字典
+        self.download_digest = ""  # 下载时计算出的更新包哈希
 
     def _format_size(self, size_bytes: int) -> str:
         """格式化文件大小（字节 → B/KB/MB/GB），带 Rich 颜色"""
@@ -44,8 +40,10 @@ class SRACLI:
             size_bytes /= 1024.0
         return f"[cyan]{size_bytes:.2f} PB[/cyan]"
 
+    @traced()
     def get_local_version(self):
         """获取本地已安装版本 - 用表格展示本地信息"""
+        from src.util import get_local_version
         self.local_version = get_local_version()
 
         # 构建本地信息表格
@@ -58,8 +56,12 @@ class SRACLI:
         console.print("\n[bold]📌 本地信息[/bold]")
         console.print(local_table)
 
+    @traced()
     async def _get_remote_version(self) -> bool:
         """异步获取远程版本信息 - 带加载提示和彩色输出"""
+        from packaging import version
+        from rich.markdown import Markdown
+        from src.util import get_remote_version
         with console.status("[bold green]🔍 正在获取最新版本信息...", spinner="dots"):
             try:
                 self.version_response = await get_remote_version()
@@ -114,8 +116,12 @@ class SRACLI:
         else:
             return f"[green]{days}天 {hours}小时 {minutes}分钟[/green]"
 
+    @traced()
     async def pre_check(self) -> bool:
         """预检查：已下载更新包校验 - 带进度提示"""
+        if DOWNLOADING_FILE.exists():
+            console.print("\n[bold yellow]⚠️  检测到未完成的下载，将继续下载[/bold yellow]")
+            return False
         if TEMP_DOWNLOAD_FILE.exists():
             console.print(f"\n[bold yellow]⚠️  检测到已下载的更新包:[/bold yellow] {TEMP_DOWNLOAD_FILE}")
             with console.status("[bold blue]🔍 正在校验更新包完整性...", spinner="line"):
@@ -124,10 +130,12 @@ class SRACLI:
         else:
             return False
 
+    @traced()
     async def hash_check(self) -> bool:
         """文件哈希校验 - 带明确结果颜色"""
+        from src.util import hash_check
         try:
-            result = await hash_check(self.version_response.data)
+            result = await hash_check(self.version_response.data, self.download_digest)
             if result:
                 console.print("[bold green]✅ 哈希校验通过[/bold green]")
                 return True
@@ -136,19 +144,24 @@ class SRACLI:
                 # 删除损坏文件（带确认）
                 if TEMP_DOWNLOAD_FILE.exists():
                     TEMP_DOWNLOAD_FILE.unlink()
+                    DOWNLOADING_FILE.unlink(missing_ok=True)
                     console.print(f"[bold cyan]🗑️  已删除损坏的更新包:[/bold cyan] {TEMP_DOWNLOAD_FILE}")
                 return False
         except Exception as e:
             console.print(f"[bold red]❌ 校验过程出错:[/bold red] {str(e)}")
             return False
 
+    @traced()
     async def download_update(self) -> bool:
         """异步下载更新包 - 用 Rich 动态进度条替代文本进度"""
+        from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, TaskProgressColumn
+        from src.util import download_update_async
         if not self.version_response:
             console.print("[bold red]❌ 无远程版本信息，无法下载[/bold red]")
             return False
 
         console.print(f"\n[bold blue]📥 开始下载更新包[/bold blue]: {self.version_response.data.version_name}")
+        self.download_digest = ""
         progress = Progress(
             TextColumn("[bold cyan]{task.description}"),
             BarColumn(),
@@ -158,30 +171,34 @@ class SRACLI:
         )
         download_task = progress.add_task("[bold]下载中...", total=0)
 
-        # 进度回调函数（更新 Rich 进度条）
-        def size_callback(total_size: int):
-            if total_size > 0:
-                progress.update(download_task, total=total_size)
-            else:
-                progress.update(download_task, total=0, description="[bold yellow]获取文件大小中...[/bold yellow]")
+        reporter = ProgressReporter()
 
-        def progress_callback(downloaded_size: int):
-            downloaded_str = self._format_size(downloaded_size)
-            total_str = self._format_size(progress.tasks[download_task].total)
+        # 进度事件（限速后更新 Rich 进度条）
+        def on_progress(event: ProgressEvent):
+            if event.total <= 0:
+                progress.update(download_task, total=0, description="[bold yellow]获取文件大小中...[/bold yellow]")
+                return
+            downloaded_str = self._format_size(event.completed)
+            total_str = self._format_size(event.total)
+            speed_str = self._format_size(event.speed)
             progress.update(
                 download_task,
-                completed=downloaded_size,
-                description=f"[bold]下载中: {downloaded_str} / {total_str}[/bold]"
+                total=event.total,
+                completed=event.completed,
+                description=f"[bold]下载中: {downloaded_str} / {total_str} ({speed_str}/s)[/bold]"
             )
 
+        reporter.subscribe(on_progress)
+
         # 启动下载（带进度条）
         with progress:
             try:
-                await download_update_async(
+                self.download_digest = await download_update_async(
                     self.version_response.data,
-                    size_callback=size_callback,
-                    progress_callback=progress_callback
+                    size_callback=reporter.set_total,
+                    progress_callback=reporter.update
                 )
+                reporter.finish()
             except Exception as e:
                 console.print(f"\n[bold red]❌ 下载失败:[/bold red] {str(e)}")
                 return False
@@ -189,42 +206,167 @@ class SRACLI:
         console.print("\n[bold green]✅ 下载完成！[/bold green]")
         return True
 
-    def unzip_update(self) -> bool:
-        """解压更新包 - 带步骤提示和颜色"""
+    @traced()
+    async def unzip_update(self, staged: bool = False) -> bool:
+        """解压更新包 - 带进度条
+
+        Args:
+            staged: 分阶段安装，先在暂存目录中准备新版本，校验通过后再关闭 SRA 并切换，保留当前版本以便回滚
+        """
+        from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, TaskProgressColumn
+        from src.extract import extract_zip
+        from src.fileops import save_installed_manifest
+        from src.staging import stage_update
+        from src.util import Castorice, get, get_local_version, set_local_version
         console.print("\n[bold blue]📦 开始解压更新包[/bold blue]")
         if not TEMP_DOWNLOAD_FILE.exists():
             console.print("[bold red]❌ 未找到更新包，解压失败[/bold red]")
             return False
 
+        # 关闭 SRA.exe（若运行），分阶段安装时推迟到切换前
+        processes = [] if staged else Castorice.find("SRA.exe")
+        if processes:
+            with console.status("[bold yellow]🔌 正在关闭运行中的 SRA.exe...", spinner="dots"):
+                await Castorice.terminate(processes)
+            console.print("[bold green]✅ 已关闭 SRA.exe[/bold green]")
+
+        progress = Progress(
+            TextColumn("[bold cyan]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            TimeRemainingColumn(),
+            transient=True,
+        )
+        # 获取哈希清单，解压时顺带校验，获取失败时只解压不校验
+        try:
+            manifest = await get(HASH_URL)
+        except Exception as e:
+            console.print(f"[bold yellow]⚠️  无法获取哈希清单，跳过解压校验:[/bold yellow] {str(e)}")
+            manifest = None
+
+        unzip_task = progress.add_task("[bold]解压中...", total=None)
+        reporter = ProgressReporter()
+        reporter.subscribe(lambda event: progress.update(
+            unzip_task, completed=event.completed, total=event.total or None,
+            description=f"[bold]解压中: {event.description}[/bold]"))
+        staged_install = None
+        with progress:
+            try:
+                if staged:
+                    staged_install = await stage_update(manifest=manifest, size_callback=reporter.set_total,
+                                                        on_file=reporter.advance)
+                    report = staged_install.report
+                else:
+                    report = await extract_zip(size_callback=reporter.set_total, on_file=reporter.advance,
+                                               manifest=manifest, skip_unchanged=True)
+                reporter.finish(description="解压完成")
+            except Exception as e:
+                console.print(f"[bold red]❌ 解压失败:[/bold red] {str(e)}")
+                console.print(f"[bold cyan]💡 提示:[/bold cyan] 请重新运行更新，或手动解压 {TEMP_DOWNLOAD_FILE} 到当前文件夹")
+                return False
+
+        version_name = self.version_response.data.version_name if self.version_response else ""
+        if not staged:
+            # version.json 不在更新包中时手动写入新版本号
+            if version_name and get_local_version() == self.local_version:
+                set_local_version(version_name)
+        console.print(f"\n[bold green]✅ 解压完成[/bold green]: {report.files} 个文件，共 {self._format_size(report.size)}")
+        if report.skipped:
+            console.print(f"[bold]跳过未变化的文件[/bold]: {report.skipped} 个，共 {self._format_size(report.skipped_size)}")
+
+        if manifest is not None:
+            # 校验报告
+            verify_table = Table(show_header=True, header_style="bold cyan", title="解压校验结果")
+            verify_table.add_column("校验通过", justify="center")
+            verify_table.add_column("哈希不匹配", justify="center")
+            verify_table.add_column("文件缺失", justify="center")
+            verify_table.add_row(
+                f"[green]{report.verified}[/green]",
+                f"[red]{len(report.mismatched)}[/red]",
+                f"[red]{len(report.missing)}[/red]"
+            )
+            console.print(verify_table)
+            for filename in report.mismatched:
+                console.print(f"  [red]哈希不匹配[/red]: {filename}")
+            for filename in report.missing:
+                console.print(f"  [red]文件缺失[/red]: {filename}")
+
+        if staged_install is not None:
+            return await self._swap_staged(staged_install, version_name)
+        if manifest is not None:
+            if report.ok:
+                # 记录当前安装的文件清单，供增量更新判断需要删除的文件
+                save_installed_manifest(manifest)
+            else:
+                console.print("[bold cyan]💡 提示:[/bold cyan] 运行 [blue]check -r[/blue] 可自动修复以上文件")
+        return True
+
+    @traced()
+    async def _swap_staged(self, staged_install: "StagedInstall", version_name: str) -> bool:
+        """校验通过后关闭 SRA 并切换到暂存目录中的新版本"""
+        from src.util import Castorice
+        if not staged_install.report.ok:
+            staged_install.discard()
+            console.print("[bold red]❌ 新版本校验未通过，已放弃切换，当前版本保持不变[/bold red]")
+            return False
+
         # 关闭 SRA.exe（若运行）
-        if Castorice.look("SRA.exe"):
+        processes = Castorice.find("SRA.exe")
+        if processes:
             with console.status("[bold yellow]🔌 正在关闭运行中的 SRA.exe...", spinner="dots"):
-                Castorice.touch("SRA.exe")
-                time.sleep(2)
+                await Castorice.terminate(processes)
             console.print("[bold green]✅ 已关闭 SRA.exe[/bold green]")
 
-        # 检查 7z 工具
-        seven_zip_path = APP_PATH / "tools/7z.exe"
-        if not seven_zip_path.exists():
-            console.print(f"[bold red]❌ 解压工具缺失:[/bold red] {seven_zip_path}")
-            console.print(f"[bold cyan]💡 提示:[/bold cyan] 请手动解压 {TEMP_DOWNLOAD_FILE} 到当前文件夹")
+        start = time.perf_counter()
+        try:
+            staged_install.swap(version_name)
+        except OSError as e:
+            staged_install.discard()
+            console.print(f"[bold red]❌ 切换版本失败，当前版本保持不变:[/bold red] {str(e)}")
+            return False
+        console.print(f"[bold green]✅ 已切换到新版本[/bold green]（耗时 {time.perf_counter() - start:.2f} 秒）")
+        console.print("[bold cyan]💡 提示:[/bold cyan] 如新版本有问题，运行 [blue]rollback[/blue] 可回滚到上一版本")
+        return True
+
+    @traced()
+    async def rollback(self) -> bool:
+        """回滚到分阶段安装前的版本"""
+        from src.staging import has_previous, restore_previous
+        from src.util import Castorice
+        console.print(Panel("[bold green]⏪ SRA 版本回滚[/bold green]", border_style="green", padding=1))
+        if not has_previous():
+            console.print("[bold red]❌ 没有可以回滚的版本[/bold red]（仅分阶段安装 [blue]update -s[/blue] 后可以回滚）")
             return False
 
-        # 执行解压命令
+        # 关闭 SRA.exe（若运行）
+        processes = Castorice.find("SRA.exe")
+        if processes:
+            with console.status("[bold yellow]🔌 正在关闭运行中的 SRA.exe...", spinner="dots"):
+                await Castorice.terminate(processes)
+            console.print("[bold green]✅ 已关闭 SRA.exe[/bold green]")
+
+        start = time.perf_counter()
         try:
-            command = f'"{seven_zip_path}" x "{TEMP_DOWNLOAD_FILE}" -y'
-            cmd = 'cmd.exe /c start "" ' + command
-            Castorice.life(cmd, shell=True)
-            console.print(f"\n[bold green]✅ 已启动解压程序[/bold green]")
-            console.print(f"[bold]解压命令:[/bold] [blue]{command}[/blue]")
-            console.print(f"[bold cyan]💡 提示:[/bold cyan] 解压完成后请重新启动 SRA")
-            return True
-        except Exception as e:
-            console.print(f"[bold red]❌ 解压失败:[/bold red] {str(e)}")
+            version = restore_previous()
+        except OSError as e:
+            console.print(f"[bold red]❌ 回滚失败，当前版本保持不变:[/bold red] {str(e)}")
             return False
+        console.print(f"[bold green]✅ 已回滚到版本 {version}[/bold green]（耗时 {time.perf_counter() - start:.2f} 秒）")
+        console.print("[bold cyan]💡 提示:[/bold cyan] 再次运行 [blue]rollback[/blue] 可恢复到回滚前的版本")
+        return True
 
-    async def integrity_check(self, auto_repair: bool = False) -> bool:
-        """文件完整性检查 - 用 Rich 进度条和表格展示结果"""
+    @traced()
+    async def integrity_check(self, auto_repair: bool = False, full: bool = False) -> bool:
+        """文件完整性检查 - 用 Rich 进度条和表格展示结果
+
+        Args:
+            auto_repair: 是否自动修复异常文件
+            full: 是否忽略哈希缓存，重新计算所有文件的哈希
+        """
+        from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn
+        from src.fileops import save_installed_manifest
+        from src.integrity import check_files, HashCache
+        from src.util import get
         console.print(Panel("[bold green]📋 SRA 文件完整性检查[/bold green]", border_style="green", padding=1))
 
         # 步骤1: 获取远程哈希字典
@@ -234,6 +376,7 @@ class SRACLI:
                 if not isinstance(hash_dict, dict):
                     raise ValueError("远程哈希数据格式无效（非字典类型）")
                 total_files = len(hash_dict)
+                self.hash_dict = hash_dict
                 console.print(f"[bold green]✅ 步骤1完成[/bold green]: 成功获取 {total_files} 个文件的哈希信息")
             except Exception as e:
                 console.print(f"[bold red]❌ 步骤1失败[/bold red]: {str(e)}")
@@ -248,27 +391,25 @@ class SRACLI:
             transient=False,
         )
         check_task = progress.add_task("[bold]正在校验文件...", total=total_files)
+        reporter = ProgressReporter(total_files)
+        reporter.subscribe(lambda event: progress.update(
+            check_task, completed=event.completed, description=f"[bold]校验中: {event.description}[/bold]"))
         self.inconsistent_files.clear()
 
-        with progress:
-            for idx, (filename, expected_hash) in enumerate(hash_dict.items(), 1):
-                file_path = APP_PATH / filename
-                # 更新进度条描述（显示当前校验的文件）
-                progress.update(check_task, description=f"[bold]校验中: {filename}[/bold]")
-
-                try:
-                    actual_hash = hash_calculate(file_path)
-                    if actual_hash != expected_hash:
-                        self.inconsistent_files.append((filename, "哈希不匹配", "red"))
-                    else:
-                        self.inconsistent_files.append((filename, "校验通过", "green"))
-                except FileNotFoundError:
-                    self.inconsistent_files.append((filename, "文件缺失", "red"))
-                except Exception as e:
-                    self.inconsistent_files.append((filename, f"校验错误: {str(e)}", "yellow"))
-
-                progress.update(check_task, advance=1)
-                await asyncio.sleep(0)  # 让出事件循环，避免卡顿
+        with progress, span("check_files", files=total_files):
+            async for result in check_files(hash_dict, cache=HashCache.load(), full=full):
+                if result.missing:
+                    self.inconsistent_files.append((result.filename, "文件缺失", "red"))
+                elif result.error:
+                    self.inconsistent_files.append((result.filename, f"校验错误: {result.error}", "yellow"))
+                elif not result.ok:
+                    self.inconsistent_files.append((result.filename, "哈希不匹配", "red"))
+                else:
+                    self.inconsistent_files.append((result.filename, "校验通过", "green"))
+
+                # 更新进度（显示当前校验的文件）
+                reporter.advance(1, description=result.filename)
+            reporter.finish(description="校验完成")
 
         # 步骤3: 展示结果（用表格分类）
         console.print("\n[bold blue]步骤3/3: 校验结果汇总[/bold blue]")
@@ -303,11 +444,17 @@ class SRACLI:
                 await self.download_missing_files()
         else:
             console.print("\n[bold green]🎉 所有文件均通过校验！[/bold green]")
+            # 记录当前安装的文件清单，供增量更新判断需要删除的文件
+            save_installed_manifest(hash_dict)
 
         return len(failed) == 0 and len(errors) == 0
 
+    @traced()
     async def download_missing_files(self) -> bool:
         """下载缺失文件 - 带批量进度条"""
+        from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn
+        from src.repair import repair_files
+        from src.util import Castorice
         # 筛选需要修复的文件（缺失/哈希不匹配）
         need_repair = [f for f, status, color in self.inconsistent_files if status in ["文件缺失", "哈希不匹配"]]
         if not need_repair:
@@ -316,10 +463,10 @@ class SRACLI:
 
         console.print(f"\n[bold blue]📥 开始修复 {len(need_repair)} 个异常文件[/bold blue]")
         # 关闭 SRA.exe（若运行）
-        if Castorice.look("SRA.exe"):
+        processes = Castorice.find("SRA.exe")
+        if processes:
             with console.status("[bold yellow]🔌 关闭 SRA.exe 中...", spinner="dots"):
-                Castorice.touch("SRA.exe")
-                time.sleep(2)
+                await Castorice.terminate(processes)
             console.print("[bold green]✅ 已关闭 SRA.exe[/bold green]")
 
         # 批量下载进度条
@@ -330,25 +477,23 @@ class SRACLI:
             transient=False,
         )
         repair_task = progress.add_task("[bold]修复中...", total=len(need_repair))
+        reporter = ProgressReporter(len(need_repair))
+        reporter.subscribe(lambda event: progress.update(
+            repair_task, completed=event.completed, description=f"[bold]修复: {event.description}[/bold]"))
         success_count = 0
 
-        with progress:
-            for idx, filename in enumerate(need_repair, 1):
-                file_url = f"https://resource.starrailassistant.top/SRA/{filename}"
-                file_path = APP_PATH / filename
-                file_path.parent.mkdir(parents=True, exist_ok=True)  # 创建父目录
-
-                # 更新进度条描述
-                progress.update(repair_task, description=f"[bold]修复: {filename}[/bold]")
-                try:
-                    await download_file_async(file_url)
+        with progress, span("repair_files", files=len(need_repair)):
+            # 并发下载，每个文件校验通过后才替换原文件
+            async for result in repair_files({filename: self.hash_dict[filename] for filename in need_repair}):
+                if result.ok:
                     success_count += 1
-                    console.print(f"\n[bold green]✅ 修复成功[/bold green]: {filename}")
-                except Exception as e:
-                    console.print(f"\n[bold red]❌ 修复失败[/bold red]: {filename} → {str(e)}")
+                    console.print(f"\n[bold green]✅ 修复成功[/bold green]: {result.filename}")
+                else:
+                    console.print(f"\n[bold red]❌ 修复失败[/bold red]: {result.filename} → {result.error}")
 
-                progress.update(repair_task, advance=1)
-                await asyncio.sleep(0)
+                # 更新进度条描述
+                reporter.advance(1, description=result.filename)
+            reporter.finish(description="修复完成")
 
         # 修复结果汇总
         console.print("\n[bold blue]📊 修复结果汇总[/bold blue]")
@@ -364,10 +509,73 @@ class SRACLI:
         console.print(summary_table)
         return success_count > 0
 
-    async def update_flow(self):
-        """完整更新流程 - 带流程标题和步骤分隔"""
+    @traced()
+    async def delta_update(self) -> bool:
+        """增量更新 - 只下载有变化的文件，不划算或失败时返回 False 以改用完整更新包"""
+        from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, TaskProgressColumn
+        from src.delta import plan_partial_update
+        from src.util import Castorice, get_local_version, set_local_version
+        if self.local_version == "0.0.0":
+            return False
+        with console.status("[bold blue]🔍 正在比对本地文件与最新版本...", spinner="dots"):
+            try:
+                plan = await plan_partial_update(self.version_response.data)
+            except Exception as e:
+                console.print(f"[bold yellow]⚠️  无法增量更新:[/bold yellow] {str(e)}")
+                return False
+        if plan is None:
+            console.print("[bold yellow]⚠️  增量更新不可用或不划算，改为下载完整更新包[/bold yellow]")
+            return False
+
+        console.print(f"\n[bold blue]📥 增量更新[/bold blue]: 下载 {len(plan.changed)} 个文件"
+                      f"（{self._format_size(plan.download_size)}），删除 {len(plan.removed)} 个文件")
+        # 关闭 SRA.exe（若运行）
+        processes = Castorice.find("SRA.exe")
+        if processes:
+            with console.status("[bold yellow]🔌 正在关闭运行中的 SRA.exe...", spinner="dots"):
+                await Castorice.terminate(processes)
+            console.print("[bold green]✅ 已关闭 SRA.exe[/bold green]")
+
+        progress = Progress(
+            TextColumn("[bold cyan]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            TimeRemainingColumn(),
+            transient=True,
+        )
+        delta_task = progress.add_task("[bold]下载中...", total=plan.download_size)
+        reporter = ProgressReporter(plan.download_size)
+        reporter.subscribe(lambda event: progress.update(
+            delta_task, completed=event.completed,
+            description=f"[bold]下载中: {self._format_size(event.completed)} / {self._format_size(event.total)}"
+                        f" ({self._format_size(event.speed)}/s)[/bold]"))
+        with progress:
+            try:
+                await plan.apply(on_chunk=reporter.advance)
+                reporter.finish()
+            except Exception as e:
+                console.print(f"\n[bold red]❌ 增量更新失败:[/bold red] {str(e)}")
+                return False
+        # version.json 不在清单中时手动写入新版本号
+        if get_local_version() == self.local_version:
+            set_local_version(self.version_response.data.version_name)
+        console.print("\n[bold green]✅ 增量更新完成！[/bold green]")
+        return True
+
+    @traced()
+    async def update_flow(self, full: bool = False, staged: bool = False):
+        """完整更新流程 - 带流程标题和步骤分隔
+
+        Args:
+            full: 始终下载完整更新包，不尝试增量更新
+            staged: 分阶段安装，保留当前版本以便回滚（需要下载完整更新包）
+        """
+        from src.util import prefetch_metadata
         console.print(Panel(f"[bold green]🚀 SRA 更新流程 (v{VERSION})[/bold green]", border_style="green", padding=1))
 
+        # 0. 同时请求之后各步骤需要的接口，后续步骤直接使用已发出请求的结果
+        prefetch_metadata()
+
         # 1. 获取本地/远程版本
         self.get_local_version()
         has_new_version = await self._get_remote_version()
@@ -379,6 +587,9 @@ class SRACLI:
         pre_check_pass = await self.pre_check()
         if pre_check_pass:
             console.print("[bold yellow]⚠️  直接使用已校验通过的更新包[/bold yellow]")
+        elif not full and not staged and await self.delta_update():
+            await self.update_announcement()
+            return
         else:
             # 3. 下载更新包
             download_success = await self.download_update()
@@ -391,8 +602,10 @@ class SRACLI:
                 return
 
         # 5. 解压更新包
-        if self.unzip_update():
-            sys.exit(0)
+        if not await self.unzip_update(staged=staged):
+            console.print("[bold red]❌ 解压失败，更新流程终止[/bold red]")
+            return
+        await self.update_announcement()
         console.print("\n" + "=" * 50)
         console.print("[bold green]🎉 更新流程所有步骤完成！[/bold green]")
         console.print("=" * 50)
@@ -416,6 +629,8 @@ class SRACLI:
         proxys = settings.get_proxys() or ["无"]
         proxys_display = "\n".join(proxys)
         config_table.add_row("[bold]代理列表", f"[blue]{proxys_display}[/blue]")
+        # 更新包缓存上限
+        config_table.add_row("[bold]更新包缓存上限", self._format_size(settings.get_package_cache_size()))
         console.print(config_table)
 
         # 仅查看模式：不进入交互
@@ -427,12 +642,13 @@ class SRACLI:
             console.print("\n[bold cyan]请选择操作（输入编号）:[/bold cyan]")
             console.print("1. 修改 Mirror 酱 CDK")
             console.print("2. 切换更新通道")
-            console.print("3. 保存配置并退出")
+            console.print("3. 修改更新包缓存上限")
+            console.print("4. 保存配置并退出")
 
             choice = Prompt.ask(
                 "[bold]请输入选项",
-                choices=["1", "2", "3"],
-                default="3",
+                choices=["1", "2", "3", "4"],
+                default="4",
                 show_choices=False
             )
 
@@ -455,24 +671,31 @@ class SRACLI:
                 console.print(f"[bold green]✅ 更新通道已切换为[/bold green]: [green]{new_channel}[/green]")
 
             elif choice == "3":
+                new_size = IntPrompt.ask(
+                    "[bold]请输入更新包缓存上限(MB)[/bold]（为 0 则不缓存）",
+                    default=settings.get_package_cache_size() // (1024 * 1024)
+                )
+                settings.set_package_cache_size(max(new_size, 0) * 1024 * 1024)
+                console.print(f"[bold green]✅ 更新包缓存上限已设置为[/bold green]: {max(new_size, 0)} MB")
+
+            elif choice == "4":
+                settings.flush()
                 console.print("[bold green]✅ 配置已保存，退出管理[/bold green]")
                 break
 
+    @traced()
     async def update_announcement(self):
         """
         更新公告信息。
         """
+        from src.util import get
         console.print("[bold blue]📢 更新公告信息[/bold blue]")
         try:
             announcement = await get(ANNOUNCEMENT_URL)
-            with open("version.json", "r+", encoding="utf-8") as json_file:
-                version_info = json.load(json_file)
-                version_info["Announcement"] = announcement.get("Announcement", [])
-
-                version_info["Proxys"] = announcement.get("Proxys", "")
-                json_file.seek(0)
-                json.dump(version_info, json_file, indent=4, ensure_ascii=False)
-                json_file.truncate()
+            if not (settings.version_file.set("Announcement", announcement.get("Announcement", []))
+                    and settings.version_file.set("Proxys", announcement.get("Proxys", ""))):
+                raise FileNotFoundError("version.json 不存在或已损坏")
+            settings.version_file.flush()
             console.print("[bold green]✅ 公告信息已更新[/bold green]")
         except Exception as e:
             console.print("[bold red]❌ 获取公告信息失败:[/bold red] {str(e)}")
@@ -1,7 +1,3 @@
-import asyncio
-import time
-from pathlib import Path
-
 from loguru import logger
 from packaging import version
 from textual import on, work
@@ -12,9 +8,16 @@ from textual.widgets import RichLog, Header, Footer, Label, Button, ProgressBar,
     Static, Input, ListItem, RadioSet, RadioButton
 
 from src import settings
-from src.const import AUTHOR, APP_PATH, VERSION, TEMP_DOWNLOAD_FILE, HASH_URL
+from src.const import AUTHOR, APP_PATH, VERSION, TEMP_DOWNLOAD_FILE, HASH_URL, DOWNLOADING_FILE
+from src.delta import plan_partial_update
+from src.extract import extract_zip
+from src.fileops import save_installed_manifest
+from src.integrity import check_files, HashCache
+from src.progress import ProgressReporter, ProgressEvent, format_duration
+from src.repair import repair_files
+from src.tracing import traced
 from src.util import get_local_version, download_update_async, get_remote_version, hash_check, Castorice, get, \
-    hash_calculate, download_file_async
+    set_local_version, prefetch_metadata
 
 
 class HomeScreen(Screen):
@@ -50,6 +53,7 @@ class HomeScreen(Screen):
         self.logger.border_title = "日志"
         self.version_response = None
         self.local_version = None
+        self.download_digest = ""
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -71,23 +75,85 @@ class HomeScreen(Screen):
 
     @on(Button.Pressed, "#update-button")
     @work
+    @traced()
     async def update(self):
         # 禁用下载按钮，防止重复点击
         download_button = self.query_one("#update-button", Button)
         download_button.disabled = True
         if not await self.pre_check():
+            if await self.delta_update():
+                download_button.disabled = False
+                return
             await self.download()
-            await self.hash_check()
-        self.unzip()
+            if not await self.hash_check():
+                # 下载中断时保留已下载的部分，再次点击即可继续下载
+                download_button.disabled = False
+                return
+        await self.unzip()
         download_button.disabled = False
 
+    @traced()
+    async def delta_update(self) -> bool:
+        """增量更新，只下载有变化的文件
+
+        Returns:
+            bool: 是否已通过增量更新完成更新，为 False 时应改用完整更新包
+        """
+        if self.local_version == "0.0.0" or not self.version_response:
+            return False
+        progress_label = self.query_one("#progress-label", Label)
+        try:
+            logger.info("正在比对本地文件与最新版本...")
+            plan = await plan_partial_update(self.version_response.data)
+        except Exception as e:
+            logger.error(f"无法增量更新: {str(e)}")
+            return False
+        if plan is None:
+            return False
+
+        processes = Castorice.find("SRA.exe")
+        if processes:
+            await Castorice.terminate(processes)
+        self.query_one("#progress-container", Horizontal).remove_class("disabled")
+        progress_bar = self.query_one("#download-progress", ProgressBar)
+        progress_bar.update(total=plan.download_size, progress=0)
+        reporter = ProgressReporter(plan.download_size)
+
+        def on_progress(event: ProgressEvent):
+            progress_bar.update(progress=event.completed)
+            progress_label.update(
+                f"增量更新: {self._format_size(event.completed)} / {self._format_size(event.total)}"
+                f" ({self._format_size(event.speed)}/s, 剩余 {format_duration(event.eta)})")
+
+        reporter.subscribe(on_progress)
+        try:
+            logger.info(f"增量更新: 下载 {len(plan.changed)} 个文件，删除 {len(plan.removed)} 个文件")
+            await plan.apply(on_chunk=reporter.advance)
+            reporter.finish()
+        except Exception as e:
+            logger.error(f"增量更新失败: {str(e)}")
+            return False
+        # version.json 不在清单中时手动写入新版本号
+        if get_local_version() == self.local_version:
+            set_local_version(self.version_response.data.version_name)
+        progress_label.update("增量更新完成")
+        logger.info("增量更新完成！")
+        self.notify("更新完成！")
+        self.get_local_version()
+        return True
+
+    @traced()
     async def pre_check(self):
+        if DOWNLOADING_FILE.exists():
+            logger.info("检测到未完成的下载，将继续下载")
+            return False
         if TEMP_DOWNLOAD_FILE.exists():
             logger.info("检测到已有下载的更新包，正在进行校验...")
             return await self.hash_check()
         else:
             return False
 
+    @traced()
     async def download(self):
         """处理下载按钮点击事件，异步下载更新文件并显示进度"""
         if not self.version_response:
@@ -104,23 +170,25 @@ class HomeScreen(Screen):
 
         # 初始化进度条
         progress_bar.progress = 0
+        self.download_digest = ""
 
-        def size_callback(total_size):
-            if total_size > 0:
-                progress_bar.update(total=total_size)
-            else:
-                progress_bar.update(total=0)
+        reporter = ProgressReporter()
 
-        # 定义进度回调函数
-        def progress_callback(downloaded_size):
-            progress_bar.update(progress=downloaded_size)
+        # 进度事件（限速后刷新进度条）
+        def on_progress(event: ProgressEvent):
+            progress_bar.update(total=event.total if event.total > 0 else None, progress=event.completed)
             progress_label.update(
-                f"下载中: {self._format_size(downloaded_size)} / {self._format_size(progress_bar.total)}")
+                f"下载中: {self._format_size(event.completed)} / {self._format_size(event.total)}"
+                f" ({self._format_size(event.speed)}/s, 剩余 {format_duration(event.eta)})")
+
+        reporter.subscribe(on_progress)
 
         try:
             logger.info(f"开始下载更新包: {self.version_response.data}")
-            await download_update_async(self.version_response.data, size_callback=size_callback,
-                                        progress_callback=progress_callback)
+            self.download_digest = await download_update_async(self.version_response.data,
+                                                               size_callback=reporter.set_total,
+                                                               progress_callback=reporter.update)
+            reporter.finish()
 
             logger.info("下载完成！")
             self.notify("下载完成！")
@@ -131,11 +199,12 @@ class HomeScreen(Screen):
             logger.error(f"下载过程中发生错误: {str(e)}")
             self.notify(f"下载失败: {str(e)}")
 
+    @traced()
     async def hash_check(self) -> bool:
         progress_label = self.query_one("#progress-label", Label)
         progress_label.update("正在校验文件完整性...")
         logger.info("正在校验文件完整性...")
-        if await hash_check(self.version_response.data):
+        if await hash_check(self.version_response.data, self.download_digest):
             progress_label.update("文件校验通过！")
             logger.info("文件校验通过！")
             return True
@@ -144,29 +213,58 @@ class HomeScreen(Screen):
             logger.error("文件校验失败，可能下载的文件已损坏，请重试！")
             return False
 
-    def unzip(self):
+    @traced()
+    async def unzip(self):
         """解压下载的更新包"""
-        if Castorice.look("SRA.exe"):
-            Castorice.touch("SRA.exe")
-            time.sleep(2)
+        processes = Castorice.find("SRA.exe")
+        if processes:
+            await Castorice.terminate(processes)
 
-        if TEMP_DOWNLOAD_FILE.exists():
-            try:
-                logger.info("解压更新文件")
-                if not Path.exists(APP_PATH / "tools/7z.exe"):
-                    logger.info(
-                        f"解压工具丢失，请手动解压{TEMP_DOWNLOAD_FILE}到当前文件夹"
-                    )
-                    self.notify("解压失败", severity="error")
-                    return
-                command = f'"{APP_PATH}\\tools\\7z" x "{TEMP_DOWNLOAD_FILE}" -y'
-                cmd = 'cmd.exe /c start "" ' + command
-                Castorice.life(cmd, shell=True)
-                self.app.exit()
-
-            except Exception as e:
-                logger.error(f"解压时出错: {e}")
-                self.notify("解压失败", severity="error")
+        if not TEMP_DOWNLOAD_FILE.exists():
+            return
+        self.query_one("#progress-container", Horizontal).remove_class("disabled")
+        progress_bar = self.query_one("#download-progress", ProgressBar)
+        progress_label = self.query_one("#progress-label", Label)
+        progress_bar.update(total=None, progress=0)
+        reporter = ProgressReporter()
+
+        def on_progress(event: ProgressEvent):
+            progress_bar.update(total=event.total or None, progress=event.completed)
+            progress_label.update(f"解压中: {event.description}")
+
+        reporter.subscribe(on_progress)
+        try:
+            manifest = await get(HASH_URL)
+        except Exception as e:
+            logger.warning(f"无法获取哈希清单，跳过解压校验: {e}")
+            manifest = None
+        try:
+            logger.info("解压更新文件")
+            report = await extract_zip(size_callback=reporter.set_total, on_file=reporter.advance, manifest=manifest,
+                                       skip_unchanged=True)
+            reporter.finish()
+        except Exception as e:
+            logger.error(f"解压时出错: {e}")
+            progress_label.update("解压失败")
+            self.notify("解压失败", severity="error")
+            return
+        # version.json 不在更新包中时手动写入新版本号
+        if self.version_response and get_local_version() == self.local_version:
+            set_local_version(self.version_response.data.version_name)
+        progress_label.update(f"解压完成: {report.files} 个文件，共 {self._format_size(report.size)}")
+        logger.info(f"解压完成！跳过 {report.skipped} 个未变化的文件（{self._format_size(report.skipped_size)}）")
+        if manifest is not None:
+            if report.ok:
+                save_installed_manifest(manifest)
+            else:
+                problems = report.mismatched + report.missing
+                logger.error(f"解压校验未通过: {problems}")
+                progress_label.update(f"解压完成，但有 {len(problems)} 个文件校验未通过，请进行完整性检查")
+                self.notify("部分文件校验未通过，请进行完整性检查", severity="warning")
+                self.get_local_version()
+                return
+        self.notify("更新完成！")
+        self.get_local_version()
 
     def _format_size(self, size_bytes):
         """格式化文件大小显示
@@ -185,6 +283,8 @@ class HomeScreen(Screen):
 
     def on_mount(self) -> None:
         self.get_local_version()
+        # 同时请求更新时需要的接口，之后获取版本信息、哈希清单时直接使用结果
+        prefetch_metadata()
         self._get_remote_version()
         log_area = self.query_one(RichLog)
 
@@ -205,6 +305,7 @@ class HomeScreen(Screen):
         self.query_one("#installed-version", Label).update(f"已安装的版本: {self.local_version}")
 
     @work
+    @traced()
     async def _get_remote_version(self) -> bool:
         """异步获取并显示远程版本信息
 
@@ -314,11 +415,12 @@ class SettingsScreen(Screen):
             Label("Proxys:", id="proxys-label"),
             ListView(*[ListItem(Static(proxy)) for proxy in settings.get_proxys()], id="proxys-list"),
         )
+        channel = settings.get_channel()
         yield Horizontal(
             Label("更新通道:", id="update-channel-label"),
             RadioSet(
-                RadioButton("stable", id="stable", value=settings.get_channel()=="stable"),
-                RadioButton("beta", id="beta", value=settings.get_channel()=="beta"),
+                RadioButton("stable", id="stable", value=channel == "stable"),
+                RadioButton("beta", id="beta", value=channel == "beta"),
             )
         )
 
@@ -346,6 +448,7 @@ class IntegrityScreen(Screen):
     }
     """
     inconsistent_files = []
+    hash_dict = {}
     def compose(self) -> ComposeResult:
         yield Header()
         yield Footer()
@@ -363,6 +466,7 @@ class IntegrityScreen(Screen):
 
     @on(Button.Pressed, "#check-button")
     @work
+    @traced()
     async def integrity_check(self):
         check_button = self.query_one("#check-button", Button)
         check_button.disabled = True
@@ -372,24 +476,28 @@ class IntegrityScreen(Screen):
             hash_dict = await get(HASH_URL)
             if not isinstance(hash_dict, dict):
                 raise ValueError("Invalid hash data format")
+            self.hash_dict = hash_dict
 
             # 2. 初始化进度条
             progress_bar = self.query_one("#check-progress", ProgressBar)
             progress_bar.progress=0
             progress_bar.total = len(hash_dict)
+            reporter = ProgressReporter(len(hash_dict))
+
+            def on_progress(event: ProgressEvent):
+                progress_bar.update(progress=event.completed)
+                progress_label.update(f"正在检查: {event.description}")
+
+            reporter.subscribe(on_progress)
 
             # 3. 检查文件完整性
             self.inconsistent_files.clear()
-            for filename, expected_hash in hash_dict.items():
-                progress_label.update(f"正在检查: {filename}")
+            async for result in check_files(hash_dict, cache=HashCache.load()):
+                if not result.ok:
+                    self.inconsistent_files.append(result.filename)
 
-                # 计算实际哈希值（假设 hash_calculate 是同步函数）
-                actual_hash = hash_calculate(filename)
-                if actual_hash != expected_hash:
-                    self.inconsistent_files.append(filename)
-
-                progress_bar.advance(1)
-                await asyncio.sleep(0)  # 让出事件循环，避免 UI 卡顿
+                reporter.advance(1, description=result.filename)
+            reporter.finish()
 
             # 4. 显示结果
             result_md = (
@@ -401,6 +509,9 @@ class IntegrityScreen(Screen):
             progress_label.update("检查完成")
             if self.inconsistent_files:
                 self.query_one("#download-missing-button", Button).remove_class("disabled")
+            else:
+                # 记录当前安装的文件清单，供增量更新判断需要删除的文件
+                save_installed_manifest(hash_dict)
 
         except Exception as e:
             # 错误处理（如网络请求失败）
@@ -412,6 +523,7 @@ class IntegrityScreen(Screen):
 
     @on(Button.Pressed, "#download-missing-button")
     @work
+    @traced()
     async def download_missing_files(self):
         if not self.inconsistent_files:
             return
@@ -423,18 +535,30 @@ class IntegrityScreen(Screen):
         progress_bar.total=len(self.inconsistent_files)
         progress_bar.progress=0
         logger.info("正在下载缺失文件...")
-        if Castorice.look("SRA.exe"):
-            Castorice.touch("SRA.exe")
-            time.sleep(2)
+        processes = Castorice.find("SRA.exe")
+        if processes:
+            await Castorice.terminate(processes)
+        reporter = ProgressReporter(len(self.inconsistent_files))
+
+        def on_progress(event: ProgressEvent):
+            progress_bar.update(progress=event.completed)
+            progress_label.update(f"正在下载: {event.description}")
+
+        reporter.subscribe(on_progress)
         try:
-            for filename in self.inconsistent_files:
-                progress_label.update(f"正在下载: {filename}")
-                file_url = f"https://resource.starrailassistant.top/SRA/{filename}"  # 替换为实际文件下载 URL
-                await download_file_async(file_url)
-                progress_bar.advance(1)
-                await asyncio.sleep(0)  # 让出事件循环，避免 UI 卡顿
-            progress_label.update("下载完成")
-            logger.info("下载完成")
+            failed = []
+            async for result in repair_files({filename: self.hash_dict[filename]
+                                              for filename in self.inconsistent_files}):
+                if not result.ok:
+                    failed.append(result.filename)
+                reporter.advance(1, description=result.filename)
+            reporter.finish()
+            if failed:
+                progress_label.update(f"{len(failed)} 个文件下载失败: {', '.join(failed[:3])}")
+                logger.error("下载失败: {}", failed)
+            else:
+                progress_label.update("下载完成")
+                logger.info("下载完成")
         except Exception as e:
             progress_label.update(f"下载失败: {str(e)}")
             logger.error(f"下载失败: {str(e)}")
@@ -1,3 +1,4 @@
+import os
 import sys
 from pathlib import Path
 
@@ -11,6 +12,8 @@ GITHUB_URL: str = (
 API_URL: str = "https://gitee.com/yukikage/sraresource/raw/main/SRA/api.json"
 HASH_URL: str = "https://gitee.com/yukikage/sraresource/raw/main/SRA/hash.json"
 ANNOUNCEMENT_URL: str = "https://gitee.com/yukikage/sraresource/raw/main/SRA/announcement.json"
+RESOURCE_URL: str = "https://resource.starrailassistant.top/SRA/{filename}"
+""" 单个文件的下载地址 """
 VERSION_URL = "https://mirrorchyan.com/api/resources/StarRailAssistant/latest?current_version=v{version}&cdk={cdk}&user_agent=SRAUpdater&channel={channel}"
 TEMP_DOWNLOAD_DIR: Path = APP_PATH / "temp"
 """ 下载临时目录 """
@@ -18,6 +21,64 @@ TEMP_DOWNLOAD_FILE: Path = TEMP_DOWNLOAD_DIR / "SRAUpdate.zip"
 """ 下载临时文件 """
 DOWNLOADING_FILE: Path = TEMP_DOWNLOAD_DIR / "SRAUpdate.zip.downloaded"
 """ 正在下载文件 """
+STAGING_DIR: Path = APP_PATH / ".staging"
+""" 分阶段安装时准备新版本的目录，与安装目录在同一文件系统上，以便硬链接和重命名 """
+PREVIOUS_DIR: Path = APP_PATH / ".previous"
+""" 分阶段安装后保留的上一代版本，用于回滚 """
+SWAP_DIR: Path = APP_PATH / ".swap"
+""" 切换版本时的中转目录 """
+PACKAGE_CACHE_DIR: Path = TEMP_DOWNLOAD_DIR / "packages"
+""" 更新包缓存目录，按 sha256 保存下载过的更新包 """
+PACKAGE_CACHE_SIZE: int = 2 * 1024 * 1024 * 1024
+""" 更新包缓存的默认容量上限(字节)，超出时删除最久未使用的更新包 """
+INSTALLED_MANIFEST_FILE: Path = APP_PATH / "data" / "manifest.json"
+""" 当前安装版本的文件哈希清单，用于增量更新时判断需要删除的文件 """
+DELTA_MAX_RATIO: float = 0.5
+""" 增量更新的下载量超过完整更新包大小的该比例时，改为下载完整更新包 """
+DOWNLOAD_SEGMENTS: int = 4
+""" 分段下载的最大并发连接数 """
+SEGMENT_MIN_SIZE: int = 4 * 1024 * 1024
+""" 单个分段的最小字节数，文件过小时不分段 """
+DOWNLOAD_CHUNK_SIZE: int = 64 * 1024
+""" 下载时每次从网络读取的字节数 """
+WRITE_BUFFER_SIZE: int = 1024 * 1024
+""" 下载写入线程合并写入的块大小 """
+WRITE_QUEUE_SIZE: int = 16
+""" 下载写入线程最多积压的块数 """
+HASH_BLOCK_SIZE: int = 1024 * 1024
+""" 计算文件哈希时每次读取的字节数 """
+HASH_WORKERS: int = min(8, os.cpu_count() or 1)
+""" 完整性检查时并发计算哈希的线程数 """
+HASH_CACHE_FILE: Path = APP_PATH / "data" / "hash_cache.json"
+""" 文件哈希缓存，文件大小、修改时间和 inode 均未变化时直接使用缓存的哈希 """
+EXTRACT_WORKERS: int = min(4, os.cpu_count() or 1)
+""" 解压更新包时并发解压的线程数和进程数 """
+EXTRACT_PARALLEL_MIN_SIZE: int = 8 * 1024 * 1024
+""" 压缩后不小于该字节数的文件放到进程池中解压 """
+EXTRACT_BUFFER_SIZE: int = 1024 * 1024
+""" 解压时每次写入的字节数 """
+PROGRESS_INTERVAL: float = 0.1
+""" 进度刷新的最短间隔(秒) """
+POOL_LIMIT: int = 32
+""" 连接池最大连接数 """
+POOL_LIMIT_PER_HOST: int = 8
+""" 连接池对单个主机的最大连接数 """
+REPAIR_RETRIES: int = 3
+""" 修复单个文件失败后的最大重试次数 """
+REPAIR_BACKOFF: float = 1.0
+""" 修复重试的初始等待时间(秒)，每次重试翻倍 """
+PROBE_SIZE: int = 256 * 1024
+""" 代理测速时每个代理请求的字节数 """
+PROBE_TIMEOUT: int = 10
+""" 代理测速的超时时间(秒) """
+METADATA_CACHE_FILE: Path = APP_PATH / "data" / "http_cache.json"
+""" 版本、哈希清单和公告等接口响应的缓存，用于条件请求 """
+METADATA_TTL: float = 30
+""" 同一次运行中重复请求同一接口时，直接使用缓存响应的有效期(秒) """
+SETTINGS_FLUSH_DELAY: float = 0.5
+""" 修改设置后延迟写入磁盘的时间(秒)，期间的多次修改合并为一次写入 """
+PROCESS_EXIT_TIMEOUT: float = 5
+""" 关闭 SRA 时等待进程正常退出的时间(秒)，超时后强制结束 """
 HEADERS: dict[str, str] = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36",
     "Referer": "https://github.com/",
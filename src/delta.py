@@ -0,0 +1,180 @@
+import asyncio
+import dataclasses
+
+import aiohttp
+from loguru import logger
+
+from src import settings
+from src.const import APP_PATH, HEADERS, RESOURCE_URL, DELTA_MAX_RATIO, POOL_LIMIT_PER_HOST, HASH_URL, GITHUB_URL, \
+    API_URL
+from src.fileops import load_installed_manifest, safe_target, save_installed_manifest
+from src.integrity import check_files, HashCache
+from src.network import get_session
+from src.remote_zip import RemoteZipPlan, plan_remote_zip
+from src.repair import repair_files
+from src.util import VersionResponseData, get, race_urls
+
+
+@dataclasses.dataclass
+class DeltaPlan:
+    """增量更新计划"""
+    manifest: dict[str, str] = dataclasses.field(default_factory=dict)
+    """ 目标版本的哈希清单 """
+    changed: dict[str, str] = dataclasses.field(default_factory=dict)
+    """ 需要下载的文件（新增或哈希不同），文件名 → 期望的 sha256 """
+    removed: list[str] = dataclasses.field(default_factory=list)
+    """ 新版本中已不存在、需要删除的文件 """
+    download_size: int = 0
+    """ 需要下载的总字节数，无法获取时为 -1 """
+    package_size: int = 0
+    """ 完整更新包的字节数（估计值） """
+
+    @property
+    def worthwhile(self) -> bool:
+        """增量更新是否比下载完整更新包更划算"""
+        if self.download_size < 0 or self.package_size <= 0:
+            return False
+        return self.download_size <= self.package_size * DELTA_MAX_RATIO
+
+    async def apply(self, on_chunk=None) -> None:
+        """执行增量更新
+
+        并发下载需要更新的文件并逐个校验、原子替换（网络错误时重试），全部成功后删除多余文件并保存新的哈希清单。
+        写入任何文件前先检查所有文件路径，指向安装目录以外的路径时不做任何修改。
+
+        Args:
+            on_chunk: 每收到一个数据块时调用，接收该块的字节数
+
+        Raises:
+            ValueError: 有文件多次重试后仍下载失败，或文件路径不安全
+        """
+        for filename in self.changed:
+            safe_target(APP_PATH, filename)
+        removed = [safe_target(APP_PATH, filename) for filename in self.removed]
+        failed = []
+        async for result in repair_files(self.changed, on_chunk=on_chunk):
+            if result.ok:
+                logger.info("已更新: {}", result.filename)
+            else:
+                failed.append(result.filename)
+        if failed:
+            raise ValueError(f"{len(failed)} 个文件更新失败: {', '.join(failed[:5])}")
+        for filename, path in zip(self.removed, removed):
+            path.unlink(missing_ok=True)
+            logger.info("已删除: {}", filename)
+        save_installed_manifest(self.manifest)
+
+
+async def _changed_files(manifest: dict[str, str]) -> tuple[dict[str, str], int]:
+    """找出本地与清单不一致的文件
+
+    Returns:
+        tuple[dict[str, str], int]: 不一致的文件，以及清单中本地已有文件的总字节数
+    """
+    changed = {}
+    local_size = 0
+    async for result in check_files(manifest, cache=HashCache.load()):
+        local_size += result.size
+        if not result.ok:
+            changed[result.filename] = result.expected
+    return changed, local_size
+
+
+async def _remote_size(filename: str, semaphore: asyncio.Semaphore) -> int:
+    """获取远程文件大小，无法获取时返回 -1"""
+    async with semaphore:
+        try:
+            async with get_session().head(RESOURCE_URL.format(filename=filename),
+                                          headers={**HEADERS, "Accept-Encoding": "identity"},
+                                          timeout=aiohttp.ClientTimeout(total=10),
+                                          allow_redirects=True) as response:
+                response.raise_for_status()
+                return int(response.headers.get('content-length', -1))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return -1
+
+
+def _installed_file(filename: str) -> bool:
+    """判断安装目录中是否有该文件，路径不安全的文件名视为没有"""
+    try:
+        return safe_target(APP_PATH, filename).is_file()
+    except ValueError:
+        logger.warning("忽略路径不安全的文件: {}", filename)
+        return False
+
+
+async def plan_delta(manifest: dict[str, str], package_size: int = 0) -> DeltaPlan:
+    """根据目标版本的哈希清单生成增量更新计划
+
+    需要删除的文件只从上次更新保存的清单中推算，不会删除清单以外的用户文件。
+
+    Args:
+        manifest: 目标版本的哈希清单，文件名 → sha256
+        package_size: 完整更新包的字节数，未知时以清单中本地文件的总大小估计
+
+    Returns:
+        DeltaPlan: 增量更新计划
+    """
+    changed, local_size = await _changed_files(manifest)
+    removed = [filename for filename in load_installed_manifest()
+               if filename not in manifest and _installed_file(filename)]
+    semaphore = asyncio.Semaphore(POOL_LIMIT_PER_HOST)
+    sizes = await asyncio.gather(*(_remote_size(filename, semaphore) for filename in changed))
+    download_size = -1 if any(size < 0 for size in sizes) else sum(sizes)
+    plan = DeltaPlan(manifest=manifest, changed=changed, removed=removed, download_size=download_size,
+                     package_size=package_size or local_size)
+    logger.info("增量更新: {} 个文件需要下载（{} 字节），{} 个文件需要删除", len(changed), download_size,
+                len(removed))
+    return plan
+
+
+async def _manifest_version() -> str:
+    """哈希清单对应的版本号
+
+    哈希清单与 api.json 一同发布在资源仓库中，清单本身只有文件名和哈希，以 api.json 记录的版本号为准。
+
+    Returns:
+        str: 不带 ``v`` 前缀的版本号，未记录时为空字符串
+    """
+    version = (await get(API_URL)).get("version")
+    return version.removeprefix("v") if isinstance(version, str) else ""
+
+
+async def plan_partial_update(version_data: VersionResponseData) -> DeltaPlan | RemoteZipPlan | None:
+    """选择只下载变化部分的更新方式
+
+    优先按哈希清单从资源站下载变化的文件；清单不可用、不划算或不是目标版本的清单时，改为通过 Range 请求
+    只下载远程更新包中变化的条目。两者都不可用或不划算时返回 None，应下载完整更新包。
+
+    Args:
+        version_data: 版本响应数据
+
+    Returns:
+        DeltaPlan | RemoteZipPlan | None: 更新计划，调用其 ``apply`` 方法执行
+    """
+    manifest = None
+    try:
+        manifest_version = await _manifest_version()
+        if manifest_version != version_data.version_name.removeprefix("v"):
+            # 资源仓库尚未同步到目标版本时，按清单更新会把旧文件标记为新版本
+            logger.info("哈希清单的版本 {} 与目标版本 {} 不一致，不按清单增量更新", manifest_version or "未知",
+                        version_data.version_name)
+        else:
+            manifest = await get(HASH_URL)
+            plan = await plan_delta(manifest, version_data.filesize)
+            if plan.worthwhile:
+                return plan
+            logger.info("按哈希清单增量更新不划算")
+    except Exception as e:
+        logger.warning("无法按哈希清单增量更新: {!r}", e)
+
+    if version_data.url != "":
+        urls = [version_data.url]
+    else:
+        urls = await race_urls([proxy + GITHUB_URL.format(version=version_data.version_name)
+                                for proxy in settings.get_proxys()])
+    remote_plan = await plan_remote_zip(urls, load_installed_manifest(), manifest)
+    if remote_plan is not None and remote_plan.worthwhile:
+        return remote_plan
+    logger.info("无法只下载变化的部分，改为下载完整更新包")
+    return None
@@ -0,0 +1,285 @@
+import asyncio
+import dataclasses
+import hashlib
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+from src.const import APP_PATH, TEMP_DOWNLOAD_FILE, EXTRACT_WORKERS, EXTRACT_PARALLEL_MIN_SIZE, EXTRACT_BUFFER_SIZE, \
+    HASH_CACHE_FILE
+from src.fileops import replace_file, safe_target
+from src.integrity import HashCache, check_files, file_digests, scan_stats
+from src.tracing import traced
+
+
+@dataclasses.dataclass
+class ExtractReport:
+    """解压结果"""
+    files: int = 0
+    """ 解压的文件数 """
+    size: int = 0
+    """ 解压后的总字节数 """
+    skipped: int = 0
+    """ 与本地文件相同而跳过的文件数 """
+    skipped_size: int = 0
+    """ 跳过的总字节数 """
+    verified: int = 0
+    """ 与哈希清单一致的文件数 """
+    mismatched: list[str] = dataclasses.field(default_factory=list)
+    """ 与哈希清单不一致的文件 """
+    missing: list[str] = dataclasses.field(default_factory=list)
+    """ 哈希清单中有、但更新包和本地都没有的文件 """
+
+    @property
+    def ok(self) -> bool:
+        """所有文件是否都通过校验"""
+        return not self.mismatched and not self.missing
+
+
+def _extract(zf: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path) -> tuple[int, str]:
+    """解压单个条目，写入临时文件后替换目标文件，CRC 校验失败时抛出 zipfile.BadZipFile
+
+    写入的同时计算 sha256，校验安装结果时无需再读取一遍文件。
+
+    Returns:
+        tuple[int, str]: 解压后的字节数和 sha256，目录返回 (0, "")
+    """
+    target = safe_target(dest, info.filename)
+    if info.is_dir():
+        target.mkdir(parents=True, exist_ok=True)
+        return 0, ""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(target.name + ".extract")
+    hash_obj = hashlib.sha256()
+    try:
+        with zf.open(info) as source, open(temp_path, 'wb') as f:
+            while block := source.read(EXTRACT_BUFFER_SIZE):
+                hash_obj.update(block)
+                f.write(block)
+        replace_file(temp_path, target)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return info.file_size, hash_obj.hexdigest()
+
+
+def _stat(path: Path) -> tuple[int, int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _is_large(info: zipfile.ZipInfo) -> bool:
+    """是否放到进程池中解压，未压缩的条目解压时只是复制数据，不值得启动进程"""
+    return info.compress_size >= EXTRACT_PARALLEL_MIN_SIZE and info.compress_type != zipfile.ZIP_STORED
+
+
+def _extract_member(zip_path: Path, name: str, dest: Path) -> tuple[int, str]:
+    """在子进程中解压单个条目"""
+    with zipfile.ZipFile(zip_path) as zf:
+        return _extract(zf, zf.getinfo(name), dest)
+
+
+async def _unchanged_entries(infos: list[zipfile.ZipInfo], dest: Path, cache: HashCache,
+                             executor: Executor) -> dict[str, str]:
+    """找出大小和 CRC32 都与本地文件相同的条目
+
+    本地文件状态未变化时使用缓存的 CRC32，否则读取一遍文件，同时计算 CRC32 和 sha256 并写入缓存。
+
+    Returns:
+        dict[str, str]: 未变化的条目，文件名 → 本地文件的 sha256，未知时为空
+    """
+    loop = asyncio.get_running_loop()
+    files = [info for info in infos if not info.is_dir()]
+    stats = await loop.run_in_executor(executor, scan_stats, dest, [info.filename for info in files])
+    unchanged = {}
+    reads = {}
+    for info in files:
+        stat = stats.get(info.filename)
+        if stat is None or stat[0] != info.file_size:
+            continue
+        crc = cache.get_crc32(info.filename, stat)
+        if crc is None:
+            reads[loop.run_in_executor(executor, file_digests, dest / info.filename)] = (info, stat)
+        elif crc == info.CRC:
+            unchanged[info.filename] = cache.get(info.filename, stat) or ""
+    if reads:
+        await asyncio.wait(reads)
+    for future, (info, stat) in reads.items():
+        try:
+            crc, digest = future.result()
+        except OSError:
+            continue
+        cache.put_crc32(info.filename, stat, crc)
+        cache.put(info.filename, stat, digest)
+        if crc == info.CRC:
+            unchanged[info.filename] = digest
+    return unchanged
+
+
+class _Extraction:
+    """记录解压结果，并用解压时顺带计算的 sha256 校验哈希清单"""
+
+    def __init__(self, dest: Path, manifest: dict[str, str] | None, on_file: Callable[[int, str], None] | None):
+        self.dest = dest
+        self.report = ExtractReport()
+        self.cache = HashCache.load(dest / HASH_CACHE_FILE.relative_to(APP_PATH))
+        self._expected = dict(manifest or {})
+        """ 尚未校验的文件 """
+        self._on_file = on_file
+
+    def _verify(self, filename: str, digest: str) -> None:
+        if filename not in self._expected or not digest:
+            return
+        if self._expected.pop(filename) == digest:
+            self.report.verified += 1
+        else:
+            self.report.mismatched.append(filename)
+
+    def skip(self, infos: list[zipfile.ZipInfo], unchanged: dict[str, str]) -> list[zipfile.ZipInfo]:
+        """跳过未变化的条目
+
+        Args:
+            infos: 更新包中的条目
+            unchanged: 未变化的条目，文件名 → 本地文件的 sha256
+
+        Returns:
+            list[zipfile.ZipInfo]: 仍需解压的条目
+        """
+        for info in infos:
+            if info.filename in unchanged:
+                self.report.skipped += 1
+                self.report.skipped_size += info.file_size
+                self._verify(info.filename, unchanged[info.filename])
+                if self._on_file:
+                    self._on_file(info.file_size, info.filename)
+        logger.info("跳过 {} 个未变化的文件，共 {} 字节", self.report.skipped, self.report.skipped_size)
+        return [info for info in infos if info.filename not in unchanged]
+
+    def written(self, info: zipfile.ZipInfo, size: int, digest: str) -> None:
+        """记录解压完成的条目，并将其哈希写入缓存"""
+        if info.is_dir():
+            return
+        self.report.files += 1
+        self.report.size += size
+        stat = _stat(self.dest / info.filename)
+        self.cache.put(info.filename, stat, digest, written=True)
+        self.cache.put_crc32(info.filename, stat, info.CRC, written=True)
+        self._verify(info.filename, digest)
+        if self._on_file:
+            self._on_file(size, info.filename)
+
+    async def check_rest(self) -> None:
+        """校验清单中尚未校验的文件
+
+        包括清单中有、但更新包中没有的文件（例如未打包的资源），以及跳过时未得到 sha256 的文件，校验本地已有的版本。
+        """
+        async for result in check_files(self._expected, self.dest, cache=self.cache):
+            if result.ok:
+                self.report.verified += 1
+            elif result.missing:
+                self.report.missing.append(result.filename)
+            else:
+                self.report.mismatched.append(result.filename)
+        logger.info("解压校验: {} 个文件通过，{} 个文件不一致，{} 个文件缺失", self.report.verified,
+                    len(self.report.mismatched), len(self.report.missing))
+
+
+def _process_pool(infos: list[zipfile.ZipInfo], workers: int) -> Executor | None:
+    """有需要放到进程池中解压的条目时创建进程池"""
+    large = sum(map(_is_large, infos))
+    if workers > 1 and large:
+        return ProcessPoolExecutor(max_workers=min(workers, large))
+    return None
+
+
+def _submit(zf: zipfile.ZipFile, zip_path: Path, infos: list[zipfile.ZipInfo], dest: Path, threads: Executor,
+            processes: Executor | None) -> dict[asyncio.Future, zipfile.ZipInfo]:
+    """将条目分配到线程池或进程池中解压
+
+    Returns:
+        dict[asyncio.Future, zipfile.ZipInfo]: 解压任务 → 条目
+    """
+    loop = asyncio.get_running_loop()
+    pending = {}
+    for info in infos:
+        if processes is not None and _is_large(info):
+            future = loop.run_in_executor(processes, _extract_member, zip_path, info.filename, dest)
+        else:
+            future = loop.run_in_executor(threads, _extract, zf, info, dest)
+        pending[future] = info
+    return pending
+
+
+def _shutdown(threads: Executor, processes: Executor | None) -> None:
+    threads.shutdown(wait=True, cancel_futures=True)
+    if processes is not None:
+        processes.shutdown(wait=True, cancel_futures=True)
+
+
+@traced()
+async def extract_zip(zip_path: Path = TEMP_DOWNLOAD_FILE, dest: Path = APP_PATH, workers: int = EXTRACT_WORKERS,
+                      size_callback: Callable[[int], None] | None = None,
+                      on_file: Callable[[int, str], None] | None = None,
+                      manifest: dict[str, str] | None = None, skip_unchanged: bool = False) -> ExtractReport:
+    """解压更新包
+
+    小文件在线程池中解压（zlib 解压和文件读写时会释放 GIL），压缩后较大的文件放到进程池中解压，
+    事件循环在此期间保持响应。每个文件先写入临时文件，完整解压并通过 CRC 校验后才替换目标文件。
+
+    ``skip_unchanged`` 为 True 时，先按 zip 中央目录记录的大小和 CRC32 与本地文件比较，只解压有变化的条目，
+    未变化的大文件不会被重写。
+
+    传入哈希清单时，用解压时顺带计算的 sha256 校验清单中的文件，并写入哈希缓存；
+    跳过的文件使用比较时得到的 sha256，清单中有、但更新包中没有的文件再单独校验本地文件。
+    结果记录在返回的 :class:`ExtractReport` 中。
+
+    Args:
+        zip_path: 更新包路径
+        dest: 解压到的目录
+        workers: 并发解压的线程数和进程数
+        size_callback: 开始解压前调用，接收解压后的总字节数
+        on_file: 每解压完（或跳过）一个文件时调用，接收该文件的字节数和文件名
+        manifest: 哈希清单，文件名 → 期望的 sha256，为 None 时不校验
+        skip_unchanged: 是否跳过与本地文件相同的条目
+
+    Returns:
+        ExtractReport: 解压结果
+
+    Raises:
+        zipfile.BadZipFile: 更新包损坏
+        ValueError: 更新包中的文件路径不安全
+        OSError: 写入文件失败
+    """
+    zf = await asyncio.to_thread(zipfile.ZipFile, zip_path)
+    infos = zf.infolist()
+    if size_callback:
+        size_callback(sum(info.file_size for info in infos))
+
+    extraction = _Extraction(dest, manifest, on_file)
+    threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Extract")
+    processes: Executor | None = None
+    pending = {}
+    try:
+        if skip_unchanged:
+            unchanged = await _unchanged_entries(infos, dest, extraction.cache, threads)
+            infos = extraction.skip(infos, unchanged)
+        processes = _process_pool(infos, workers)
+        pending = _submit(zf, zip_path, infos, dest, threads, processes)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                extraction.written(pending.pop(future), *future.result())
+    finally:
+        for future in pending:
+            future.cancel()
+        # 等待已开始的解压结束后再关闭 zip 文件和保存缓存，避免仍在运行的线程读取已关闭的文件
+        await asyncio.to_thread(_shutdown, threads, processes)
+        zf.close()
+        extraction.cache.save()
+
+    if manifest is not None:
+        await extraction.check_rest()
+    return extraction.report
@@ -0,0 +1,58 @@
+import json
+import os
+from pathlib import Path
+
+from src.const import INSTALLED_MANIFEST_FILE
+
+
+def safe_target(root: Path, name: str) -> Path:
+    """计算文件在 root 下的路径，拒绝绝对路径、带盘符或包含 ``..`` 的路径，以及经链接指向 root 以外的路径
+
+    更新包条目和哈希清单中的文件名都来自网络，写入或删除文件前都要经过此检查。
+
+    Raises:
+        ValueError: 文件路径不安全
+    """
+    path = Path(name)
+    if path.is_absolute() or path.drive or ".." in path.parts:
+        raise ValueError(f"更新包中的文件路径不安全: {name}")
+    target = (root / path).resolve()
+    if not target.is_relative_to(root.resolve()):
+        raise ValueError(f"更新包中的文件路径不安全: {name}")
+    return target
+
+
+def replace_file(temp_path: Path, target: Path) -> None:
+    """用临时文件替换目标文件
+
+    Windows 上无法覆盖正在运行的程序和已加载的 DLL（例如更新器自身），但可以重命名它们，
+    此时先把旧文件改名为 ``.old`` 再替换。``.old`` 文件会一直保留，直到下次替换同一文件时再次遇到占用才被覆盖。
+    """
+    try:
+        os.replace(temp_path, target)
+    except PermissionError:
+        old_path = target.with_name(target.name + ".old")
+        try:
+            old_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        os.replace(target, old_path)
+        os.replace(temp_path, target)
+
+
+def load_installed_manifest() -> dict[str, str]:
+    """读取当前安装版本的文件哈希清单，不存在时返回空字典"""
+    try:
+        with open(INSTALLED_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_installed_manifest(manifest: dict[str, str]) -> None:
+    """保存当前安装版本的文件哈希清单"""
+    INSTALLED_MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = INSTALLED_MANIFEST_FILE.with_suffix(".tmp")
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temp_file, INSTALLED_MANIFEST_FILE)
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+from loguru import logger
+
+from src.const import METADATA_CACHE_FILE, METADATA_TTL
+from src.network import get_session
+
+
+class MetadataCache:
+    """接口响应缓存
+
+    保存响应的 ETag/Last-Modified 和内容，再次请求时发送 ``If-None-Match``/``If-Modified-Since``，
+    服务器返回 304 时直接使用缓存的内容。同一次运行中 ``ttl`` 秒内的重复请求不访问网络，
+    同时发出的相同请求只会请求一次。
+
+    缓存以链接的 sha256 为键，链接本身（包括其中的 CDK）不会写入磁盘，但响应内容会原样保存。
+    响应中含有凭据时（例如 Mirror酱 返回的、经 CDK 授权的下载链接）应传入 ``persist=False``，
+    此时响应只在本次运行中缓存，也不会发送条件请求。
+    """
+
+    def __init__(self, path: Path = METADATA_CACHE_FILE):
+        self._path = path
+        self._entries: dict[str, dict] | None = None
+        """ 链接的 sha256 → {"etag": ..., "last_modified": ..., "body": ...}，首次使用时读取 """
+        self._fresh: dict[str, tuple[float, str]] = {}
+        """ 链接的 sha256 → (获取时间, 内容)，仅在本次运行中有效 """
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                self._entries = entries if isinstance(entries, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self._path.with_suffix(".tmp")
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(temp_file, self._path)
+        except OSError as e:
+            logger.warning("无法保存接口缓存: {}", e)
+
+    async def get_json(self, url: str, timeout: int = 10, ttl: float = METADATA_TTL, persist: bool = True) -> Any:
+        """获取 JSON 响应
+
+        Args:
+            url: 链接
+            timeout: 超时时间(秒)
+            ttl: 本次运行中已获取的响应在该时间内直接使用，为 0 时总是发出请求
+            persist: 是否将响应保存到磁盘，供之后的运行发送条件请求
+
+        Returns:
+            Any: 解析后的 JSON，每次调用返回新的对象，可以随意修改
+
+        Raises:
+            aiohttp.ClientError: 网络请求错误
+            asyncio.TimeoutError: 请求超时
+            json.JSONDecodeError: JSON 解析错误
+        """
+        key = hashlib.sha256(url.encode()).hexdigest()
+        fresh = self._fresh.get(key)
+        if fresh is not None and time.monotonic() - fresh[0] < ttl:
+            return json.loads(fresh[1])
+        future = self._pending.get(key)
+        if future is None or future.get_loop() is not asyncio.get_running_loop():
+            future = asyncio.ensure_future(self._fetch(url, key, timeout, persist))
+            self._pending[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return json.loads(await asyncio.shield(future))
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        # 其他事件循环中可能已为同一链接发出新的请求，只移除自己
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    async def _fetch(self, url: str, key: str, timeout: int, persist: bool) -> str:
+        entries = self._load()
+        if not persist and entries.pop(key, None) is not None:
+            # 清除此前版本写入磁盘的响应
+            self._save()
+        entry = entries.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        async with get_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status == 304 and entry is not None:
+                logger.debug("接口内容未变化，使用缓存: {}", response.url.host)
+                body = entry["body"]
+            else:
+                response.raise_for_status()
+                body = await response.text()
+                json.loads(body)
+                etag = response.headers.get("etag", "")
+                last_modified = response.headers.get("last-modified", "")
+                if persist and (etag or last_modified):
+                    self._entries[key] = {"etag": etag, "last_modified": last_modified, "body": body}
+                    self._save()
+                elif self._entries.pop(key, None) is not None:
+                    self._save()
+        self._fresh[key] = (time.monotonic(), body)
+        return body
+
+
+metadata_cache = MetadataCache()
+""" 进程内共享的接口响应缓存 """
@@ -0,0 +1,262 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import stat as stat_module
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator
+
+from loguru import logger
+
+from src.const import APP_PATH, HASH_WORKERS, HASH_BLOCK_SIZE, HASH_CACHE_FILE
+
+_RACY_WINDOW_NS = 2 * 10 ** 9
+""" 修改时间距今不足该值的文件不写入缓存，避免同一时间戳内再次修改却未被发现 """
+
+
+@dataclasses.dataclass
+class FileCheckResult:
+    """单个文件的校验结果"""
+    filename: str
+    expected: str
+    actual: str = ""
+    """ 实际的 sha256，文件缺失或出错时为空 """
+    size: int = 0
+    """ 文件字节数 """
+    missing: bool = False
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.error and self.actual == self.expected
+
+
+def hash_file(path: Path) -> tuple[str, int]:
+    """分块计算文件的 sha256，内存占用与文件大小无关
+
+    Returns:
+        tuple[str, int]: sha256 和文件字节数
+
+    Raises:
+        OSError: 文件不存在或无法读取
+    """
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest(), f.tell()
+        hash_obj = hashlib.sha256()
+        while block := f.read(HASH_BLOCK_SIZE):
+            hash_obj.update(block)
+        return hash_obj.hexdigest(), f.tell()
+
+
+_Stat = tuple[int, int, int]
+""" (文件字节数, 修改时间(纳秒), inode) """
+
+
+class HashCache:
+    """按文件状态缓存的哈希索引
+
+    记录每个文件计算哈希时的大小、修改时间和 inode，三者都未变化时认为文件未被修改，直接使用缓存的哈希，
+    重复的完整性检查只需重新计算有变化的文件。除 sha256 外还可以缓存 CRC32，供解压时与 zip 条目比较。
+    """
+
+    def __init__(self, path: Path = HASH_CACHE_FILE):
+        self._path = path
+        self._entries: dict[str, list] = {}
+        """ 文件名 → [文件字节数, 修改时间(纳秒), inode, sha256, CRC32]，未计算的 sha256 为空，CRC32 为 None """
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path = HASH_CACHE_FILE) -> "HashCache":
+        """读取缓存，文件不存在或已损坏时返回空缓存"""
+        cache = cls(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                cache._entries = entries
+        except (OSError, ValueError):
+            pass
+        return cache
+
+    def _lookup(self, filename: str, stat: _Stat, index: int):
+        entry = self._entries.get(filename)
+        if entry is not None and tuple(entry[:3]) == stat and len(entry) > index:
+            return entry[index]
+        return None
+
+    def _store(self, filename: str, stat: _Stat, index: int, value, written: bool) -> None:
+        if not written and time.time_ns() - stat[1] < _RACY_WINDOW_NS:
+            self._entries.pop(filename, None)
+        else:
+            entry = self._entries.get(filename)
+            if entry is None or tuple(entry[:3]) != stat:
+                entry = self._entries[filename] = [*stat, "", None]
+            entry.extend([None] * (5 - len(entry)))
+            entry[index] = value
+        self._dirty = True
+
+    def get(self, filename: str, stat: _Stat) -> str | None:
+        """文件状态与缓存一致时返回缓存的 sha256"""
+        return self._lookup(filename, stat, 3) or None
+
+    def put(self, filename: str, stat: _Stat, digest: str, written: bool = False) -> None:
+        """记录文件的 sha256
+
+        Args:
+            filename: 文件名
+            stat: 计算哈希前获取的文件状态
+            digest: 文件的 sha256
+            written: 文件是否由本程序刚刚写入，此时内容已知，即使修改时间很近也写入缓存
+        """
+        self._store(filename, stat, 3, digest, written)
+
+    def get_crc32(self, filename: str, stat: _Stat) -> int | None:
+        """文件状态与缓存一致时返回缓存的 CRC32"""
+        return self._lookup(filename, stat, 4)
+
+    def put_crc32(self, filename: str, stat: _Stat, crc: int, written: bool = False) -> None:
+        """记录文件的 CRC32，参数同 :meth:`put`"""
+        self._store(filename, stat, 4, crc, written)
+
+    def save(self) -> None:
+        """有变化时保存缓存"""
+        if not self._dirty:
+            return
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self._path.with_suffix(".tmp")
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_file, self._path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning("无法保存哈希缓存: {}", e)
+
+
+def scan_stats(root: Path, filenames) -> dict[str, _Stat]:
+    """批量获取文件状态
+
+    按所在目录分组，每个目录只用 ``os.scandir`` 遍历一次，不存在的文件不会出现在结果中。
+    目录项中找不到的文件名（例如在不区分大小写的文件系统上大小写与清单不同）再单独用 ``os.stat`` 获取。
+
+    Args:
+        root: 文件名相对的根目录
+        filenames: 文件名列表
+
+    Returns:
+        dict[str, tuple[int, int, int]]: 文件名 → (文件字节数, 修改时间(纳秒), inode)
+    """
+    directories: dict[Path, dict[str, str]] = {}
+    for filename in filenames:
+        path = Path(filename)
+        directories.setdefault(path.parent, {})[path.name] = filename
+
+    stats = {}
+    for directory, names in directories.items():
+        try:
+            with os.scandir(root / directory) as it:
+                for entry in it:
+                    filename = names.get(entry.name)
+                    if filename is None or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    stats[filename] = (stat.st_size, stat.st_mtime_ns, entry.inode())
+        except OSError:
+            pass
+        _stat_unmatched(root, [filename for filename in names.values() if filename not in stats], stats)
+    return stats
+
+
+def _stat_unmatched(root: Path, filenames: list[str], stats: dict[str, _Stat]) -> None:
+    """逐个获取目录项中没有找到的文件的状态，存在的普通文件加入 stats"""
+    for filename in filenames:
+        try:
+            stat = os.stat(root / filename)
+        except OSError:
+            continue
+        if stat_module.S_ISREG(stat.st_mode):
+            stats[filename] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def file_digests(path: Path) -> tuple[int, str]:
+    """读取一遍文件，同时计算 CRC32 和 sha256
+
+    Raises:
+        OSError: 文件不存在或无法读取
+    """
+    crc = 0
+    hash_obj = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            crc = zlib.crc32(block, crc)
+            hash_obj.update(block)
+    return crc, hash_obj.hexdigest()
+
+
+def _check_file(root: Path, filename: str, expected: str) -> FileCheckResult:
+    result = FileCheckResult(filename=filename, expected=expected)
+    try:
+        result.actual, result.size = hash_file(root / filename)
+    except FileNotFoundError:
+        result.missing = True
+    except OSError as e:
+        result.error = str(e)
+    return result
+
+
+async def check_files(manifest: dict[str, str], root: Path = APP_PATH, workers: int = HASH_WORKERS,
+                      cache: HashCache | None = None, full: bool = False) -> AsyncIterator[FileCheckResult]:
+    """并发校验文件哈希
+
+    在线程池中计算哈希（hashlib 计算时会释放 GIL，可以利用多核），同时处理的文件数不超过线程数的两倍，
+    结果按完成顺序产出，事件循环在此期间保持响应。
+    传入 ``cache`` 时，状态未变化的文件直接使用缓存的哈希，结束后将新计算的哈希写回缓存。
+
+    Args:
+        manifest: 哈希清单，文件名 → 期望的 sha256
+        root: 文件名相对的根目录
+        workers: 线程数
+        cache: 哈希缓存
+        full: 是否忽略缓存重新计算所有文件（仍会更新缓存）
+
+    Yields:
+        FileCheckResult: 每个文件的校验结果
+    """
+    loop = asyncio.get_running_loop()
+    stats = await asyncio.to_thread(scan_stats, root, manifest) if cache is not None else {}
+    items = iter(manifest.items())
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="IntegrityCheck")
+    pending = set()
+    try:
+        while True:
+            for filename, expected in items:
+                stat = stats.get(filename)
+                if cache is not None and stat is None:
+                    yield FileCheckResult(filename=filename, expected=expected, missing=True)
+                    continue
+                digest = cache.get(filename, stat) if cache is not None and not full else None
+                if digest is not None:
+                    yield FileCheckResult(filename=filename, expected=expected, actual=digest, size=stat[0])
+                    continue
+                pending.add(loop.run_in_executor(executor, _check_file, root, filename, expected))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if cache is not None and result.actual:
+                    cache.put(result.filename, stats[result.filename], result.actual)
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if cache is not None:
+            cache.save()
@@ -0,0 +1,37 @@
+import asyncio
+
+import aiohttp
+
+from src.const import POOL_LIMIT, POOL_LIMIT_PER_HOST
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """获取进程内共享的 aiohttp 会话
+
+    所有请求共用同一个连接池：保持长连接、缓存 DNS 结果并限制单个主机的并发连接数，
+    修复大量文件时不必为每个文件重新建立 TCP/TLS 连接。会话与创建它的事件循环绑定，
+    事件循环变化时会重新创建。超时时间由各请求自行指定。
+
+    Returns:
+        aiohttp.ClientSession: 共享会话
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST,
+                                         ttl_dns_cache=300, keepalive_timeout=30)
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+async def close_session() -> None:
+    """关闭共享会话，在程序退出前调用"""
+    global _session, _session_loop
+    if _session is not None and not _session.closed and _session_loop is asyncio.get_running_loop():
+        await _session.close()
+    _session = None
+    _session_loop = None
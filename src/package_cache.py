@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from src import settings
+from src.const import PACKAGE_CACHE_DIR
+from src.integrity import hash_file
+
+_INDEX_FILE = "index.json"
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    """用硬链接在 target 处放置 source，不支持硬链接时复制
+
+    两者共享数据，之后写入 target 前必须先删除它，不能直接覆盖写入。
+    """
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class PackageCache:
+    """按 sha256 保存的更新包缓存
+
+    每个更新包以 ``<sha256>.zip`` 保存，索引中记录大小和最后使用时间。
+    总大小超过上限时按最久未使用的顺序删除更新包。切换更新通道或重装已下载过的版本时无需重新下载。
+    只按版本信息给出的 sha256 查找，不按版本号查找：同一版本号的更新包可能被重新发布，无法确认缓存的仍是同一个文件。
+    """
+
+    def __init__(self, directory: Path = PACKAGE_CACHE_DIR, max_size: int | None = None):
+        """
+        Args:
+            directory: 缓存目录
+            max_size: 容量上限(字节)，为 None 时使用设置中的值
+        """
+        self._directory = directory
+        self._max_size = settings.get_package_cache_size() if max_size is None else max_size
+        self._packages: dict[str, dict] = {}
+        """ sha256 → {"size": 字节数, "last_used": 最后使用时间} """
+
+    @classmethod
+    def load(cls, directory: Path = PACKAGE_CACHE_DIR, max_size: int | None = None) -> "PackageCache":
+        """读取缓存索引，索引不存在或已损坏时返回空缓存"""
+        cache = cls(directory, max_size)
+        try:
+            with open(directory / _INDEX_FILE, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            cache._packages = dict(index.get("packages", {}))
+        except (OSError, ValueError, AttributeError, TypeError):
+            pass
+        return cache
+
+    def save(self) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        temp_file = self._directory / (_INDEX_FILE + ".tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"packages": self._packages}, f)
+        os.replace(temp_file, self._directory / _INDEX_FILE)
+
+    def _path(self, sha256: str) -> Path:
+        return self._directory / f"{sha256}.zip"
+
+    def fetch(self, sha256: str, target: Path) -> int:
+        """从缓存中取出更新包
+
+        取出前重新计算哈希，缓存文件损坏时将其删除。
+
+        Args:
+            sha256: 更新包的 sha256
+            target: 放置更新包的路径
+
+        Returns:
+            int: 更新包字节数，未缓存时返回 -1
+        """
+        if sha256 not in self._packages:
+            return -1
+        path = self._path(sha256)
+        try:
+            actual, size = hash_file(path)
+        except OSError:
+            actual, size = "", -1
+        if actual != sha256:
+            logger.warning("缓存的更新包已损坏，删除: {}", path.name)
+            self._remove(sha256)
+            self.save()
+            return -1
+        _link_or_copy(path, target)
+        self._packages[sha256]["last_used"] = time.time()
+        self.save()
+        return size
+
+    def add(self, source: Path, sha256: str) -> None:
+        """将已校验的更新包加入缓存，超出容量上限时删除最久未使用的更新包
+
+        Args:
+            source: 更新包路径
+            sha256: 更新包的 sha256，调用方需保证与文件内容一致
+        """
+        size = source.stat().st_size
+        if size > self._max_size:
+            return
+        self._directory.mkdir(parents=True, exist_ok=True)
+        if sha256 not in self._packages or not self._path(sha256).exists():
+            _link_or_copy(source, self._path(sha256))
+        self._packages[sha256] = {"size": size, "last_used": time.time()}
+        self._evict(keep=sha256)
+        self.save()
+
+    def _remove(self, sha256: str) -> None:
+        self._packages.pop(sha256, None)
+        self._path(sha256).unlink(missing_ok=True)
+
+    def _evict(self, keep: str) -> None:
+        total = sum(package["size"] for package in self._packages.values())
+        for sha256 in sorted(self._packages, key=lambda digest: self._packages[digest]["last_used"]):
+            if total <= self._max_size:
+                break
+            if sha256 == keep:
+                continue
+            total -= self._packages[sha256]["size"]
+            logger.info("更新包缓存超出上限，删除最久未使用的更新包: {}", sha256)
+            self._remove(sha256)
@@ -0,0 +1,105 @@
+import dataclasses
+import time
+from typing import Callable
+
+from src.const import PROGRESS_INTERVAL
+
+
+@dataclasses.dataclass
+class ProgressEvent:
+    """进度事件"""
+    completed: int = 0
+    """ 已完成量（字节数或文件数） """
+    total: int = 0
+    """ 总量，未知时为 0 """
+    speed: float = 0.0
+    """ 平滑后的速度（每秒完成量） """
+    eta: float | None = None
+    """ 预计剩余秒数，无法估计时为 None """
+    description: str = ""
+    """ 当前步骤的描述，例如正在处理的文件名 """
+    finished: bool = False
+
+
+class ProgressReporter:
+    """限速的进度事件流
+
+    下载、校验等过程可以任意频繁地调用 :meth:`update`/:meth:`advance`，
+    订阅者最多每 ``interval`` 秒收到一次 :class:`ProgressEvent`，事件中带有指数平滑后的速度和剩余时间。
+    :meth:`set_total` 与 :meth:`update` 的签名与下载函数的 ``size_callback``/``progress_callback`` 一致，可直接传入。
+    """
+
+    def __init__(self, total: int = 0, interval: float = PROGRESS_INTERVAL, smoothing: float = 0.3):
+        """
+        Args:
+            total: 总量，未知时为 0
+            interval: 两次事件之间的最短间隔(秒)
+            smoothing: 速度的平滑系数，越大越偏向最近的速度
+        """
+        self._interval = interval
+        self._smoothing = smoothing
+        self._subscribers: list[Callable[[ProgressEvent], None]] = []
+        self._event = ProgressEvent(total=total)
+        self._last_emit = 0.0
+        self._last_completed = 0
+        self._last_time = time.monotonic()
+
+    def subscribe(self, callback: Callable[[ProgressEvent], None]) -> None:
+        """订阅进度事件"""
+        self._subscribers.append(callback)
+
+    @property
+    def event(self) -> ProgressEvent:
+        """最新的进度"""
+        return self._event
+
+    def set_total(self, total: int) -> None:
+        """设置总量并立即通知订阅者"""
+        self._event.total = total
+        self._emit()
+
+    def update(self, completed: int, description: str | None = None) -> None:
+        """设置已完成量"""
+        self._event.completed = completed
+        if description is not None:
+            self._event.description = description
+        if time.monotonic() - self._last_emit >= self._interval:
+            self._emit()
+
+    def advance(self, amount: int = 1, description: str | None = None) -> None:
+        """增加已完成量"""
+        self.update(self._event.completed + amount, description)
+
+    def finish(self, description: str | None = None) -> None:
+        """标记完成并立即通知订阅者"""
+        if description is not None:
+            self._event.description = description
+        self._event.finished = True
+        self._emit()
+
+    def _emit(self) -> None:
+        now = time.monotonic()
+        event = self._event
+        elapsed = now - self._last_time
+        if elapsed > 0 and event.completed >= self._last_completed:
+            speed = (event.completed - self._last_completed) / elapsed
+            event.speed = speed if event.speed == 0 else \
+                self._smoothing * speed + (1 - self._smoothing) * event.speed
+        if event.speed > 0 and event.total > 0:
+            event.eta = max(event.total - event.completed, 0) / event.speed
+        else:
+            event.eta = None
+        self._last_completed = event.completed
+        self._last_time = now
+        self._last_emit = now
+        for callback in self._subscribers:
+            callback(event)
+
+
+def format_duration(seconds: float | None) -> str:
+    """格式化剩余时间，无法估计时返回 "--:--" """
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
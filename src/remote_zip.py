@@ -0,0 +1,376 @@
+import asyncio
+import dataclasses
+import struct
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Collection
+
+import aiohttp
+from loguru import logger
+
+from src.const import APP_PATH, HEADERS, DELTA_MAX_RATIO, POOL_LIMIT_PER_HOST, DOWNLOAD_CHUNK_SIZE
+from src.fileops import replace_file, safe_target, save_installed_manifest
+from src.integrity import HashCache, file_digests, scan_stats
+from src.network import get_session
+from src.writer import FileWriter
+
+_EOCD = struct.Struct("<4sHHHHIIH")
+_ZIP64_LOCATOR = struct.Struct("<4sIQI")
+_ZIP64_EOCD = struct.Struct("<4sQHHIIQQQQ")
+_CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_TAIL_SIZE = 64 * 1024 + _EOCD.size
+""" 读取文件末尾的字节数，足以容纳最长的 zip 注释 """
+_LOCAL_EXTRA_SLACK = 1024
+""" 本地文件头扩展字段可能比中央目录中的更长，下载时多取的字节数 """
+
+
+@dataclasses.dataclass
+class ZipEntry:
+    """zip 中央目录中的一个条目"""
+    filename: str
+    crc32: int
+    compress_size: int
+    file_size: int
+    header_offset: int
+    compress_type: int
+    flags: int
+    extra_length: int
+
+    @property
+    def is_dir(self) -> bool:
+        return self.filename.endswith("/")
+
+
+class RemoteZip:
+    """通过 HTTP Range 请求按需读取远程 zip 文件
+
+    只下载文件末尾的中央目录即可得到所有条目的 CRC32 和大小，之后按需下载单个条目的压缩数据。
+    """
+
+    def __init__(self, url: str, timeout: int = 60):
+        self.url = url
+        self.size = 0
+        self.entries: list[ZipEntry] = []
+        self._timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        self._central_offset = 0
+
+    async def _read(self, start: int, end: int) -> bytes:
+        """读取闭区间 [start, end] 的字节"""
+        headers = {**HEADERS, "Range": f"bytes={start}-{end}"}
+        async with get_session().get(self.url, headers=headers, timeout=self._timeout) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise aiohttp.ClientPayloadError("服务器不支持 Range 请求")
+            return await response.read()
+
+    async def open(self) -> None:
+        """读取中央目录
+
+        Raises:
+            aiohttp.ClientError: 网络请求错误或服务器不支持 Range 请求
+            ValueError: 不是有效的 zip 文件
+        """
+        headers = {**HEADERS, "Range": f"bytes=-{_TAIL_SIZE}"}
+        async with get_session().get(self.url, headers=headers, timeout=self._timeout) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise aiohttp.ClientPayloadError("服务器不支持 Range 请求")
+            total = response.headers.get('content-range', '').rpartition('/')[2]
+            if not total.isdigit():
+                raise aiohttp.ClientPayloadError("无法获取远程文件大小")
+            self.size = int(total)
+            # 重定向后的地址（如 GitHub 的签名链接）直接用于后续请求
+            self.url = str(response.url)
+            tail = await response.read()
+
+        position = tail.rfind(b"PK\x05\x06")
+        if position < 0:
+            raise ValueError("未找到 zip 中央目录结束标记")
+        _, _, _, _, count, central_size, central_offset, _ = _EOCD.unpack_from(tail, position)
+        if central_offset == 0xFFFFFFFF or count == 0xFFFF:
+            locator = position - _ZIP64_LOCATOR.size
+            _, _, zip64_offset, _ = _ZIP64_LOCATOR.unpack_from(tail, locator)
+            record = await self._read(zip64_offset, zip64_offset + _ZIP64_EOCD.size - 1)
+            fields = _ZIP64_EOCD.unpack_from(record)
+            count, central_size, central_offset = fields[7], fields[8], fields[9]
+
+        self._central_offset = central_offset
+        tail_start = self.size - len(tail)
+        if central_offset >= tail_start:
+            central = tail[central_offset - tail_start:central_offset - tail_start + central_size]
+        else:
+            central = await self._read(central_offset, central_offset + central_size - 1)
+        self.entries = list(self._parse_central(central, count))
+
+    @staticmethod
+    def _parse_central(data: bytes, count: int):
+        position = 0
+        for _ in range(count):
+            fields = _CENTRAL_HEADER.unpack_from(data, position)
+            if fields[0] != b"PK\x01\x02":
+                raise ValueError("zip 中央目录已损坏")
+            flags, compress_type = fields[3], fields[4]
+            crc, compress_size, file_size = fields[7], fields[8], fields[9]
+            name_length, extra_length, comment_length = fields[10], fields[11], fields[12]
+            header_offset = fields[16]
+            position += _CENTRAL_HEADER.size
+            raw_name = data[position:position + name_length]
+            filename = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+            extra = data[position + name_length:position + name_length + extra_length]
+            file_size, compress_size, header_offset = _apply_zip64_extra(extra, file_size, compress_size,
+                                                                         header_offset)
+            position += name_length + extra_length + comment_length
+            yield ZipEntry(filename=filename.replace("\\", "/"), crc32=crc, compress_size=compress_size,
+                           file_size=file_size, header_offset=header_offset, compress_type=compress_type,
+                           flags=flags, extra_length=extra_length)
+
+    async def extract(self, entry: ZipEntry, path: Path, on_chunk=None) -> str:
+        """下载并解压单个条目，校验 CRC32 后替换目标文件
+
+        Args:
+            entry: zip 条目
+            path: 目标路径
+            on_chunk: 每收到一个数据块时调用，接收该块的（压缩后）字节数
+
+        Returns:
+            str: 解压后文件的 sha256
+
+        Raises:
+            aiohttp.ClientError: 网络请求错误
+            ValueError: 不支持的压缩方式或 CRC32 校验失败
+        """
+        if entry.compress_type == zipfile.ZIP_STORED:
+            decompressor = None
+        elif entry.compress_type == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-15)
+        else:
+            raise ValueError(f"不支持的压缩方式: {entry.compress_type}")
+        if entry.flags & 0x1:
+            raise ValueError(f"不支持加密的条目: {entry.filename}")
+
+        start = entry.header_offset
+        end = min(start + _LOCAL_HEADER.size + len(entry.filename.encode("utf-8")) + entry.extra_length
+                  + _LOCAL_EXTRA_SLACK + entry.compress_size, self._central_offset) - 1
+        headers = {**HEADERS, "Range": f"bytes={start}-{end}"}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + ".download")
+        async with get_session().get(self.url, headers=headers, timeout=self._timeout) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise aiohttp.ClientPayloadError("服务器不支持 Range 请求")
+            writer = FileWriter(temp_path, entry.file_size)
+            try:
+                crc = await self._inflate(response, entry, decompressor, writer, on_chunk)
+            except BaseException:
+                await writer.close(finish=False)
+                temp_path.unlink(missing_ok=True)
+                raise
+            digest = await writer.close()
+        if crc != entry.crc32:
+            temp_path.unlink(missing_ok=True)
+            raise ValueError(f"{entry.filename} CRC32 校验失败")
+        await asyncio.to_thread(replace_file, temp_path, path)
+        return digest
+
+    @staticmethod
+    async def _inflate(response: aiohttp.ClientResponse, entry: ZipEntry, decompressor, writer: FileWriter,
+                       on_chunk) -> int:
+        """跳过本地文件头，将压缩数据流式解压写入 writer，返回解压后数据的 CRC32"""
+        header = b""
+        remaining = entry.compress_size
+        position = 0
+        crc = 0
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            if header is not None:
+                header += chunk
+                skip = _local_header_size(header, entry)
+                if skip < 0:
+                    continue
+                chunk, header = header[skip:], None
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            if on_chunk:
+                # 本地文件头和多取的字节不计入，与按压缩大小计算的总进度一致
+                on_chunk(len(chunk))
+            data = decompressor.decompress(chunk) if decompressor else chunk
+            if data:
+                await writer.write(position, data)
+                position += len(data)
+                crc = zlib.crc32(data, crc)
+            if remaining <= 0:
+                break
+        if remaining > 0:
+            raise aiohttp.ClientPayloadError(f"{entry.filename} 数据不完整")
+        if decompressor:
+            data = decompressor.flush()
+            if data:
+                await writer.write(position, data)
+                crc = zlib.crc32(data, crc)
+        return crc
+
+
+def _local_header_size(data: bytes, entry: ZipEntry) -> int:
+    """计算本地文件头（含文件名和扩展字段）的长度，data 还不足以包含整个文件头时返回 -1
+
+    Raises:
+        ValueError: 本地文件头已损坏
+    """
+    if len(data) < _LOCAL_HEADER.size:
+        return -1
+    fields = _LOCAL_HEADER.unpack_from(data)
+    if fields[0] != b"PK\x03\x04":
+        raise ValueError(f"{entry.filename} 本地文件头已损坏")
+    size = _LOCAL_HEADER.size + fields[9] + fields[10]
+    return size if len(data) >= size else -1
+
+
+def _apply_zip64_extra(extra: bytes, file_size: int, compress_size: int, header_offset: int) -> tuple[int, int, int]:
+    """用 ZIP64 扩展字段中的值替换被置为 0xFFFFFFFF 的字段"""
+    position = 0
+    while position + 4 <= len(extra):
+        tag, size = struct.unpack_from("<HH", extra, position)
+        if tag == 0x0001:
+            values = iter(struct.unpack_from(f"<{size // 8}Q", extra, position + 4))
+            if file_size == 0xFFFFFFFF:
+                file_size = next(values)
+            if compress_size == 0xFFFFFFFF:
+                compress_size = next(values)
+            if header_offset == 0xFFFFFFFF:
+                header_offset = next(values)
+            break
+        position += 4 + size
+    return file_size, compress_size, header_offset
+
+
+def _changed_entries(entries: list[ZipEntry]) -> tuple[list[ZipEntry], dict[str, str]]:
+    """找出大小或 CRC32 与本地文件不同的条目，本地文件状态未变化时使用缓存的 CRC32
+
+    Returns:
+        tuple[list[ZipEntry], dict[str, str]]: 有变化的条目，以及未变化的文件名 → sha256
+    """
+    cache = HashCache.load()
+    files = [entry for entry in entries if not entry.is_dir]
+    stats = scan_stats(APP_PATH, [entry.filename for entry in files])
+    changed = []
+    unchanged = {}
+    for entry in files:
+        stat = stats.get(entry.filename)
+        if stat is None or stat[0] != entry.file_size:
+            changed.append(entry)
+            continue
+        crc = cache.get_crc32(entry.filename, stat)
+        digest = cache.get(entry.filename, stat)
+        if crc is None or digest is None:
+            try:
+                crc, digest = file_digests(APP_PATH / entry.filename)
+            except OSError:
+                changed.append(entry)
+                continue
+            cache.put_crc32(entry.filename, stat, crc)
+            cache.put(entry.filename, stat, digest)
+        if crc != entry.crc32:
+            changed.append(entry)
+        else:
+            unchanged[entry.filename] = digest
+    cache.save()
+    return changed, unchanged
+
+
+@dataclasses.dataclass
+class RemoteZipPlan:
+    """从远程 zip 中只下载有变化条目的更新计划"""
+    remote_zip: RemoteZip
+    changed: list[ZipEntry] = dataclasses.field(default_factory=list)
+    """ 需要下载的条目 """
+    removed: list[str] = dataclasses.field(default_factory=list)
+    """ 新版本中已不存在、需要删除的文件 """
+    unchanged: dict[str, str] = dataclasses.field(default_factory=dict)
+    """ 与本地文件相同的条目，文件名 → sha256 """
+    kept: dict[str, str] = dataclasses.field(default_factory=dict)
+    """ 不在更新包中但需要保留的文件（例如未打包的资源），沿用当前清单中的 sha256 """
+
+    @property
+    def download_size(self) -> int:
+        return sum(entry.compress_size for entry in self.changed)
+
+    @property
+    def package_size(self) -> int:
+        return self.remote_zip.size
+
+    @property
+    def worthwhile(self) -> bool:
+        """只下载变化的条目是否比下载完整更新包更划算"""
+        return self.download_size <= self.package_size * DELTA_MAX_RATIO
+
+    async def apply(self, on_chunk=None) -> None:
+        """并发下载并解压变化的条目，全部成功后删除多余文件并保存新的哈希清单
+
+        写入任何文件前先检查所有条目和待删除文件的路径，指向安装目录以外的路径时不做任何修改。
+
+        Raises:
+            aiohttp.ClientError: 网络请求错误
+            ValueError: 不支持的条目、CRC32 校验失败或文件路径不安全
+        """
+        targets = {entry.filename: safe_target(APP_PATH, entry.filename) for entry in self.remote_zip.entries}
+        removed = [safe_target(APP_PATH, filename) for filename in self.removed]
+        for entry in self.remote_zip.entries:
+            if entry.is_dir:
+                targets[entry.filename].mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(POOL_LIMIT_PER_HOST)
+        manifest = {**self.kept, **self.unchanged}
+
+        async def fetch(entry: ZipEntry):
+            async with semaphore:
+                manifest[entry.filename] = await self.remote_zip.extract(entry, targets[entry.filename], on_chunk)
+                logger.info("已更新: {}", entry.filename)
+
+        await asyncio.gather(*(fetch(entry) for entry in self.changed))
+        for filename, path in zip(self.removed, removed):
+            path.unlink(missing_ok=True)
+            logger.info("已删除: {}", filename)
+        save_installed_manifest(manifest)
+
+
+async def plan_remote_zip(urls: list[str], installed_manifest: dict[str, str],
+                          resources: Collection[str] | None) -> RemoteZipPlan | None:
+    """读取远程更新包的中央目录，与本地文件比对生成更新计划
+
+    安装清单来自哈希清单，其中可能有不在更新包中的资源，因此只删除安装清单中有、
+    而更新包和目标版本的哈希清单中都没有的文件。
+
+    Args:
+        urls: 更新包的候选下载链接，依次尝试
+        installed_manifest: 当前安装版本的哈希清单，用于判断需要删除的文件
+        resources: 目标版本哈希清单中的文件名，为 None（清单不可用）时无法区分资源与已删除的文件，不删除任何文件
+
+    Returns:
+        RemoteZipPlan | None: 更新计划，所有链接都无法按需读取时返回 None
+    """
+    for url in urls:
+        remote_zip = RemoteZip(url)
+        try:
+            await remote_zip.open()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, struct.error) as e:
+            logger.warning("无法按需读取远程更新包 {}: {!r}", url, e)
+            continue
+        changed, unchanged = await asyncio.to_thread(_changed_entries, remote_zip.entries)
+        names = {entry.filename for entry in remote_zip.entries}
+        removed = []
+        kept = {}
+        for filename, sha256 in installed_manifest.items():
+            if filename in names:
+                continue
+            if resources is not None and filename not in resources:
+                if (APP_PATH / filename).is_file():
+                    removed.append(filename)
+            else:
+                kept[filename] = sha256
+        plan = RemoteZipPlan(remote_zip=remote_zip, changed=changed, removed=removed, unchanged=unchanged,
+                             kept=kept)
+        logger.info("远程更新包中 {} 个条目有变化（{} 字节），{} 个文件需要删除", len(changed), plan.download_size,
+                    len(removed))
+        return plan
+    return None
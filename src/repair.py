@@ -0,0 +1,108 @@
+import asyncio
+import dataclasses
+import random
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+import aiohttp
+from loguru import logger
+
+from src.const import APP_PATH, RESOURCE_URL, POOL_LIMIT_PER_HOST, REPAIR_RETRIES, REPAIR_BACKOFF
+from src.fileops import safe_target
+from src.util import download_to_path
+
+
+@dataclasses.dataclass
+class RepairResult:
+    """单个文件的修复结果"""
+    filename: str
+    attempts: int = 0
+    """ 尝试下载的次数 """
+    error: str = ""
+    """ 最后一次失败的原因，成功时为空 """
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+def _retryable(error: BaseException) -> bool:
+    """判断下载错误是否值得重试
+
+    资源不存在等客户端错误重试也不会成功；哈希校验失败（ValueError）说明资源站上的文件与清单不一致，同样不重试。
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+async def _repair_file(filename: str, expected_hash: str, root: Path, semaphore: asyncio.Semaphore,
+                       retries: int, on_chunk: Callable[[int], None] | None) -> RepairResult:
+    result = RepairResult(filename=filename)
+    received = 0  # 本次尝试已报告的字节数
+
+    def count(size: int) -> None:
+        nonlocal received
+        received += size
+        on_chunk(size)
+
+    try:
+        target = safe_target(root, filename)
+    except ValueError as e:
+        logger.error("修复失败: {} → {}", filename, e)
+        result.error = str(e)
+        return result
+
+    while True:
+        result.attempts += 1
+        received = 0
+        try:
+            async with semaphore:
+                await download_to_path(RESOURCE_URL.format(filename=filename), target,
+                                       expected_hash, on_chunk=count if on_chunk else None)
+            result.error = ""
+            return result
+        except Exception as e:
+            if received:
+                # 失败的尝试不计入进度，避免重试后进度超过 100%
+                on_chunk(-received)
+            result.error = str(e) or repr(e)
+            if result.attempts > retries or not _retryable(e):
+                logger.error("修复失败: {} → {}", filename, result.error)
+                return result
+        delay = REPAIR_BACKOFF * 2 ** (result.attempts - 1)
+        delay += random.uniform(0, delay)
+        logger.warning("修复 {} 失败（{}），{:.1f} 秒后第 {} 次重试", filename, result.error, delay, result.attempts)
+        await asyncio.sleep(delay)
+
+
+async def repair_files(files: dict[str, str], root: Path = APP_PATH, concurrency: int = POOL_LIMIT_PER_HOST,
+                       retries: int = REPAIR_RETRIES,
+                       on_chunk: Callable[[int], None] | None = None) -> AsyncIterator[RepairResult]:
+    """并发修复文件
+
+    从资源站并发下载文件，同时进行的下载不超过 ``concurrency`` 个。
+    每个文件先写入目标旁边的临时文件，哈希校验通过后原子地替换目标文件；文件名指向 ``root`` 以外的文件直接判为失败；
+    网络错误时按指数退避重试，哈希校验失败不重试，结果按完成顺序产出。
+
+    Args:
+        files: 需要修复的文件，文件名 → 期望的 sha256
+        root: 文件名相对的根目录
+        concurrency: 最大并发下载数
+        retries: 单个文件失败后的最大重试次数
+        on_chunk: 每收到一个数据块时调用，接收该块的字节数；某次尝试失败时以负数撤回该次尝试报告过的字节数
+
+    Yields:
+        RepairResult: 每个文件的修复结果
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(_repair_file(filename, expected_hash, root, semaphore, retries, on_chunk))
+             for filename, expected_hash in files.items()]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        # 等待取消完成，被取消的下载会删除各自的临时文件
+        await asyncio.gather(*tasks, return_exceptions=True)
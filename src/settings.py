@@ -1,10 +1,12 @@
+import asyncio
+import atexit
 import dataclasses
 import json
 import os
 
 from loguru import logger
 
-from src import encryption
+from src.const import PACKAGE_CACHE_SIZE, SETTINGS_FLUSH_DELAY
 
 
 @dataclasses.dataclass
@@ -16,94 +18,214 @@ class Settings:
     """ 系统代理 """
     channel: str = "stable"
     """ 更新通道 """
+    package_cache_size: int = PACKAGE_CACHE_SIZE
+    """ 更新包缓存容量上限(字节) """
 
 
 temp_settings = Settings(mirrorchyan_cdk="", proxys=["https://gh-proxy.com/", "", ])
 
 
+class SettingsFile:
+    """带缓存的 JSON 设置文件
+
+    文件只在首次读取和修改时间变化后重新解析，其余读取直接使用内存中的内容。
+    修改先保存在内存中，在事件循环中延迟 ``SETTINGS_FLUSH_DELAY`` 秒、没有事件循环时立即写入磁盘，
+    期间的多次修改合并为一次写入。写入时先写临时文件再替换，不会留下写了一半的文件；
+    若文件在此期间被其他代码改写，会在新内容的基础上应用修改。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 文件路径，相对于工作目录
+        """
+        self._path = path
+        self._data: dict | None = None
+        self._stat: tuple[int, int] | None = None
+        """ 已解析内容对应的 (修改时间, 大小)，文件不存在时为 None """
+        self._pending: dict = {}
+        """ 尚未写入磁盘的修改 """
+        self._handle: asyncio.TimerHandle | None = None
+
+    def _current_stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self) -> dict | None:
+        """获取文件内容（包括尚未写入的修改）
+
+        Returns:
+            dict | None: 文件内容，文件不存在或无法解析时为 None
+        """
+        stat = self._current_stat()
+        if stat is None:
+            self._data = self._stat = None
+            return None
+        if stat != self._stat:
+            try:
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                data = None
+            self._data = data if isinstance(data, dict) else None
+            self._stat = stat
+        if self._data is not None and self._pending:
+            self._data.update(self._pending)
+        return self._data
+
+    def get(self, key: str, default=None):
+        """读取配置项
+
+        Raises:
+            FileNotFoundError: 文件不存在或无法解析
+        """
+        data = self.load()
+        if data is None:
+            raise FileNotFoundError(self._path)
+        return data.get(key, default)
+
+    def set(self, key: str, value) -> bool:
+        """修改配置项，稍后写入磁盘
+
+        Returns:
+            bool: 文件不存在或无法解析、修改未保存时为 False
+        """
+        data = self.load()
+        if data is None:
+            return False
+        data[key] = value
+        self._pending[key] = value
+        self._schedule_flush()
+        return True
+
+    def _schedule_flush(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._handle is None:
+            self._handle = loop.call_later(SETTINGS_FLUSH_DELAY, self.flush)
+
+    def flush(self) -> None:
+        """立即写入尚未保存的修改"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending:
+            return
+        data = self.load()
+        self._pending.clear()
+        if data is not None:
+            self._write(data)
+
+    def replace(self, data: dict) -> None:
+        """用 data 替换整个文件的内容并立即写入，文件不存在或无法解析时用于新建"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._pending.clear()
+        self._write(data)
+
+    def _write(self, data: dict) -> None:
+        temp_file = self._path + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+            os.replace(temp_file, self._path)
+            self._data = data
+            self._stat = self._current_stat()
+        except OSError as e:
+            logger.error(f"保存设置文件 {self._path} 失败: {e}")
+
+
+version_file = SettingsFile('version.json')
+globals_file = SettingsFile('data/globals.json')
+_cdk_cache: tuple[str, str] = ("", "")
+""" 最近一次解密的 (密文, 明文)，密文不变时不再调用 DPAPI """
+
+
+def flush():
+    """立即写入所有尚未保存的设置"""
+    version_file.flush()
+    globals_file.flush()
+
+
+atexit.register(flush)
+
+
 def get_mirrorchyan_cdk() -> str:
     """获取 MirrorChyan CDK"""
+    global _cdk_cache
     try:
-        with open('data/globals.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        cdk = config.get('mirrorchyanCDK','')
-        return encryption.win_decryptor(cdk)
-    except KeyError:
-        return temp_settings.mirrorchyan_cdk
+        cdk = globals_file.get('mirrorchyanCDK', '')
     except FileNotFoundError:
         return temp_settings.mirrorchyan_cdk
-    except json.JSONDecodeError:
-        return temp_settings.mirrorchyan_cdk
+    if cdk != _cdk_cache[0]:
+        from src import encryption  # 用到时才加载 win32crypt
+        _cdk_cache = (cdk, encryption.win_decryptor(cdk))
+    return _cdk_cache[1]
 
 
 def get_proxys() -> list[str]:
     """获取系统代理"""
     try:
-        with open('version.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config.get("Proxys", [])
+        return version_file.get("Proxys", [])
     except FileNotFoundError:
         return temp_settings.proxys
-    except json.JSONDecodeError:
-        return temp_settings.proxys
 
 
 def set_mirrorchyan_cdk(cdk: str):
     """设置 MirrorChyan CDK"""
+    global _cdk_cache
     try:
-        if not os.path.exists('data'):
+        from src import encryption
+        encrypted = encryption.win_encryptor(cdk)
+        if not globals_file.set("mirrorchyanCDK", encrypted):
             temp_settings.mirrorchyan_cdk = cdk
             return
-        if not os.path.exists('data/globals.json'):
-            temp_settings.mirrorchyan_cdk = cdk
-            return
-        with open('data/globals.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        config["mirrorchyanCDK"] = encryption.win_encryptor(cdk)
-        with open('data/globals.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        _cdk_cache = (encrypted, cdk)
     except Exception as e:
         logger.error(f"设置 MirrorChyan CDK 失败: {e}")
 
 
 def set_proxys(proxys: list[str]):
     """设置系统代理"""
-    try:
-        if not os.path.exists('version.json'):
-            temp_settings.proxys = proxys
-            return
-        with open('version.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        config["Proxys"] = proxys
-        with open('version.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"设置系统代理失败: {e}")
+    if not version_file.set("Proxys", proxys):
+        temp_settings.proxys = proxys
+
 
 def get_channel() -> str:
     """获取更新通道"""
     try:
-        with open('version.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        return config.get("channel", "stable")
+        return version_file.get("channel", "stable")
     except FileNotFoundError:
         return temp_settings.channel
-    except json.JSONDecodeError:
-        return temp_settings.channel
+
 
 def set_channel(channel: str):
     """设置更新通道"""
+    if not version_file.set("channel", channel):
+        temp_settings.channel = channel
+
+
+def get_package_cache_size() -> int:
+    """获取更新包缓存容量上限(字节)"""
     try:
-        if not os.path.exists('version.json'):
-            temp_settings.channel = channel
-            return
-        with open('version.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        config["channel"] = channel
-        with open('version.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"设置更新通道失败: {e}")
+        return int(version_file.get("PackageCacheSize", temp_settings.package_cache_size))
+    except FileNotFoundError:
+        return temp_settings.package_cache_size
+    except (ValueError, TypeError):
+        return temp_settings.package_cache_size
+
+
+def set_package_cache_size(size: int):
+    """设置更新包缓存容量上限(字节)，为 0 时不缓存"""
+    if not version_file.set("PackageCacheSize", size):
+        temp_settings.package_cache_size = size
 
 
 def can_save_settings() -> bool:
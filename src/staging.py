@@ -0,0 +1,248 @@
+import asyncio
+import dataclasses
+import json
+import os
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+from src.const import APP_PATH, TEMP_DOWNLOAD_FILE, TEMP_DOWNLOAD_DIR, STAGING_DIR, PREVIOUS_DIR, SWAP_DIR
+from src.extract import ExtractReport, extract_zip
+from src.fileops import load_installed_manifest, safe_target, save_installed_manifest
+from src.tracing import traced
+from src.util import get_local_version, set_local_version
+
+_GENERATION_FILE = "generation.json"
+_RESERVED = {STAGING_DIR.name, PREVIOUS_DIR.name, SWAP_DIR.name, TEMP_DOWNLOAD_DIR.name}
+""" 不参与切换的顶层目录 """
+
+
+@dataclasses.dataclass
+class Generation:
+    """保留在 ``PREVIOUS_DIR`` 中的上一代版本"""
+    version: str = ""
+    """ 版本号 """
+    entries: list[str] = dataclasses.field(default_factory=list)
+    """ 切换时交换的顶层文件和目录 """
+    manifest: dict[str, str] = dataclasses.field(default_factory=dict)
+    """ 该版本的文件哈希清单 """
+
+    @classmethod
+    def load(cls) -> "Generation | None":
+        """读取上一代版本的记录，不存在时返回 None"""
+        try:
+            with open(PREVIOUS_DIR / _GENERATION_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(version=data.get("version", ""), entries=data.get("entries", []),
+                       manifest=data.get("manifest", {}))
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def save(self) -> None:
+        with open(PREVIOUS_DIR / _GENERATION_FILE, 'w', encoding='utf-8') as f:
+            json.dump(dataclasses.asdict(self), f, ensure_ascii=False)
+
+
+def _link_tree(source: Path, target: Path) -> None:
+    """用硬链接在 target 处重建 source，不支持硬链接的文件系统上改为复制"""
+    if source.is_file():
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        return
+    shutil.copytree(source, target, copy_function=_link_or_copy, symlinks=True, dirs_exist_ok=True)
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _exchange(live_root: Path, other_root: Path, entries: list[str]) -> None:
+    """交换两个目录中的顶层条目
+
+    每个条目只需几次重命名，耗时与文件数量无关。任一步失败时按相反顺序撤销已完成的重命名，安装目录保持原样。
+
+    Raises:
+        OSError: 重命名失败，例如文件仍被占用
+    """
+    SWAP_DIR.mkdir(exist_ok=True)
+    moves = []
+
+    def move(source: Path, target: Path) -> None:
+        os.replace(source, target)
+        moves.append((source, target))
+
+    try:
+        for name in entries:
+            live, other, temp = live_root / name, other_root / name, SWAP_DIR / name
+            if os.path.lexists(live):
+                move(live, temp)
+            if os.path.lexists(other):
+                move(other, live)
+            if os.path.lexists(temp):
+                move(temp, other)
+    except OSError:
+        for source, target in reversed(moves):
+            os.replace(target, source)
+        raise
+    finally:
+        try:
+            SWAP_DIR.rmdir()
+        except OSError:
+            pass
+
+
+@dataclasses.dataclass
+class StagedInstall:
+    """在 ``STAGING_DIR`` 中准备好的新版本，调用 :meth:`swap` 切换"""
+    entries: list[str]
+    """ 需要交换的顶层文件和目录 """
+    report: ExtractReport
+    """ 解压结果 """
+    manifest: dict[str, str] | None = None
+    """ 新版本的文件哈希清单 """
+
+    def swap(self, version_name: str) -> None:
+        """切换到新版本，当前版本移入 ``PREVIOUS_DIR`` 以便回滚
+
+        调用前需要关闭正在运行的 SRA。
+
+        Args:
+            version_name: 新版本号，version.json 不在更新包中时写入
+
+        Raises:
+            OSError: 文件仍被占用等原因导致切换失败，此时安装目录保持原样
+        """
+        previous = Generation(version=get_local_version(), entries=self.entries,
+                              manifest=load_installed_manifest())
+        _exchange(APP_PATH, STAGING_DIR, self.entries)
+        try:
+            # 切换成功后才删除上一代版本，此前放弃或切换失败时仍可回滚
+            shutil.rmtree(PREVIOUS_DIR, ignore_errors=True)
+            os.replace(STAGING_DIR, PREVIOUS_DIR)
+        except OSError:
+            _exchange(APP_PATH, STAGING_DIR, self.entries)
+            raise
+        previous.save()
+        if self.manifest is not None and self.report.ok:
+            save_installed_manifest(self.manifest)
+        if version_name and get_local_version() == previous.version:
+            set_local_version(version_name)
+        logger.info("已切换到新版本 {}，上一版本 {} 可以回滚", version_name, previous.version)
+
+    def discard(self) -> None:
+        """放弃准备好的新版本"""
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+
+def _top_level(name: str) -> str:
+    """返回条目所在的顶层文件或目录名，拒绝包含 ``..``、绝对路径或盘符的条目
+
+    Raises:
+        ValueError: 条目路径不安全
+    """
+    safe_target(STAGING_DIR, name)
+    top = name.split("/", 1)[0]
+    if top in ("", ".", "..") or ":" in top:
+        raise ValueError(f"更新包中的文件路径不安全: {name}")
+    return top
+
+
+def _prepare(zip_path: Path, manifest: dict[str, str] | None) -> list[str]:
+    """检查更新包中的路径，清理旧的暂存目录，用硬链接把更新包涉及的当前文件放入暂存目录
+
+    Returns:
+        list[str]: 更新包中的顶层文件和目录
+
+    Raises:
+        ValueError: 更新包中的文件路径不安全
+    """
+    with zipfile.ZipFile(zip_path) as zf:
+        entries = sorted({_top_level(name) for name in zf.namelist()} - _RESERVED)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    STAGING_DIR.mkdir(parents=True)
+    for name in entries:
+        if os.path.lexists(APP_PATH / name):
+            _link_tree(APP_PATH / name, STAGING_DIR / name)
+    # 删除新版本中已不存在的文件，与增量更新一样只处理上次记录在清单中的文件
+    if manifest is not None:
+        for filename in load_installed_manifest():
+            if filename not in manifest and filename.split("/", 1)[0] in entries:
+                (STAGING_DIR / filename).unlink(missing_ok=True)
+    return entries
+
+
+@traced()
+async def stage_update(zip_path: Path = TEMP_DOWNLOAD_FILE, manifest: dict[str, str] | None = None,
+                       size_callback: Callable[[int], None] | None = None,
+                       on_file: Callable[[int, str], None] | None = None) -> StagedInstall:
+    """在暂存目录中准备新版本
+
+    更新包涉及的当前文件以硬链接放入暂存目录（不复制数据），再只解压有变化的文件，
+    解压时写入临时文件后替换，不会修改与当前版本共享的文件。整个过程不影响正在运行的 SRA。
+
+    Args:
+        zip_path: 更新包路径
+        manifest: 哈希清单，文件名 → 期望的 sha256，为 None 时不校验
+        size_callback: 开始解压前调用，接收解压后的总字节数
+        on_file: 每解压完（或跳过）一个文件时调用，接收该文件的字节数和文件名
+
+    Returns:
+        StagedInstall: 准备好的新版本
+
+    Raises:
+        zipfile.BadZipFile: 更新包损坏
+        ValueError: 更新包中的文件路径不安全
+        OSError: 写入文件失败
+    """
+    entries = await asyncio.to_thread(_prepare, zip_path, manifest)
+    staged_manifest = None
+    if manifest is not None:
+        # 更新包不涉及的文件不会被切换，无需在暂存目录中校验
+        staged_manifest = {filename: sha256 for filename, sha256 in manifest.items()
+                           if filename.split("/", 1)[0] in entries}
+    try:
+        report = await extract_zip(zip_path, STAGING_DIR, size_callback=size_callback, on_file=on_file,
+                                   manifest=staged_manifest, skip_unchanged=True)
+    except BaseException:
+        await asyncio.to_thread(shutil.rmtree, STAGING_DIR, True)
+        raise
+    return StagedInstall(entries=entries, report=report, manifest=manifest)
+
+
+def has_previous() -> bool:
+    """是否有可以回滚的上一代版本"""
+    return Generation.load() is not None
+
+
+def restore_previous() -> str:
+    """回滚到上一代版本
+
+    只交换当前版本与上一代版本的顶层条目，不复制文件；回滚后当前版本成为新的上一代版本，再次回滚即可恢复。
+    调用前需要关闭正在运行的 SRA。
+
+    Returns:
+        str: 回滚后的版本号
+
+    Raises:
+        FileNotFoundError: 没有可以回滚的版本
+        OSError: 文件仍被占用等原因导致切换失败，此时安装目录保持原样
+    """
+    previous = Generation.load()
+    if previous is None:
+        raise FileNotFoundError("没有可以回滚的版本")
+    current = Generation(version=get_local_version(), entries=previous.entries, manifest=load_installed_manifest())
+    _exchange(APP_PATH, PREVIOUS_DIR, previous.entries)
+    current.save()
+    save_installed_manifest(previous.manifest)
+    if previous.version and get_local_version() != previous.version:
+        set_local_version(previous.version)
+    logger.info("已回滚到版本 {}", previous.version)
+    return previous.version
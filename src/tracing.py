@@ -0,0 +1,145 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+_events: list[dict] | None = None
+""" 记录的追踪事件，为 None 时未启用追踪 """
+_origin = 0
+_tracks: dict[int, int] = {}
+""" 任务或线程 → 追踪视图中的轨道编号 """
+
+
+def start() -> None:
+    """开始记录追踪事件"""
+    global _events, _origin
+    _events = []
+    _origin = time.perf_counter_ns()
+    _tracks.clear()
+
+
+def _track() -> int:
+    """当前任务（或线程）对应的轨道，同一任务中的阶段按调用关系嵌套显示"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    key = id(task) if task is not None else threading.get_ident()
+    track = _tracks.get(key)
+    if track is None:
+        track = _tracks[key] = len(_tracks) + 1
+        name = task.get_name() if task is not None else threading.current_thread().name
+        _events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": track, "args": {"name": name}})
+    return track
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "phase", **args):
+    """记录 with 块的耗时，未启用追踪时不做任何事
+
+    Args:
+        name: 阶段名
+        category: 分类，可在追踪视图中筛选
+        **args: 附加在事件上的参数，例如主机名、文件数，不要传入完整链接，见 :func:`url_host`
+    """
+    if _events is None:
+        yield
+        return
+    track = _track()
+    started = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _events.append({"name": name, "cat": category, "ph": "X", "ts": (started - _origin) / 1000,
+                        "dur": (time.perf_counter_ns() - started) / 1000, "pid": os.getpid(), "tid": track,
+                        "args": args})
+
+
+def url_host(url: str) -> str:
+    """链接的主机名，用作事件参数
+
+    追踪文件可能会分享给他人，链接的查询参数（例如 Mirror酱 的 CDK）和签名下载链接的路径都不能写入。
+    """
+    return urlsplit(url).hostname or ""
+
+
+def traced(name: str | None = None, category: str = "phase"):
+    """将整个函数（同步或异步）记录为一个阶段，默认以函数的限定名为阶段名"""
+
+    def decorator(func):
+        label = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(label, category):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(label, category):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def save(path: Path) -> None:
+    """以 Chrome trace-event 格式保存记录的事件，可在 chrome://tracing 或 Perfetto 中打开"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": _events or [], "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+def _save_profile(profiler, path: Path) -> None:
+    import pstats
+    import tracemalloc
+
+    # 先取内存快照，避免统计到生成报告本身的内存分配
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    profiler.dump_stats(path.with_suffix(".prof"))
+    with open(path.with_suffix(".profile.txt"), 'w', encoding='utf-8') as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(60)
+
+    with open(path.with_suffix(".memory.txt"), 'w', encoding='utf-8') as f:
+        f.write(f"当前: {current / 1024 / 1024:.2f} MB, 峰值: {peak / 1024 / 1024:.2f} MB\n\n")
+        for stat in snapshot.statistics("lineno")[:30]:
+            f.write(f"{stat}\n")
+
+
+@contextlib.contextmanager
+def session(path: str | None, profile: bool = False):
+    """在 with 块内记录追踪事件，结束时保存
+
+    Args:
+        path: 追踪文件路径，为 None 时不追踪
+        profile: 同时用 cProfile 和 tracemalloc 分析，报告保存在追踪文件旁边：
+            ``.prof``（可用 snakeviz 等工具打开）、``.profile.txt`` 和 ``.memory.txt``
+    """
+    if path is None:
+        yield
+        return
+    path = Path(path)
+    start()
+    profiler = None
+    if profile:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span("run", "main"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _save_profile(profiler, path)
+        save(path)
@@ -1,13 +1,24 @@
+import asyncio
 import dataclasses
 import hashlib
 import json
+import os
+import time
+from pathlib import Path
 from typing import Any
 
 import aiohttp
 from loguru import logger
 
 from src import settings
-from src.const import VERSION_URL, HEADERS, TEMP_DOWNLOAD_FILE, GITHUB_URL, API_URL
+from src.http_cache import metadata_cache
+from src.network import get_session
+from src.package_cache import PackageCache
+from src.tracing import span, traced, url_host
+from src.writer import FileWriter, add_range
+from src.const import VERSION_URL, HEADERS, TEMP_DOWNLOAD_FILE, GITHUB_URL, API_URL, HASH_URL, ANNOUNCEMENT_URL, \
+    DOWNLOAD_SEGMENTS, SEGMENT_MIN_SIZE, DOWNLOADING_FILE, PROBE_SIZE, PROBE_TIMEOUT, HASH_BLOCK_SIZE, \
+    DOWNLOAD_CHUNK_SIZE, METADATA_TTL, PROCESS_EXIT_TIMEOUT
 
 
 @dataclasses.dataclass
@@ -52,20 +63,64 @@ class VersionResponseBody:
 def get_local_version() -> str:
     """获取本地版本号"""
     try:
-        with open('version.json', 'r', encoding='utf-8') as f:
-            version_data = json.load(f)
-        return version_data.get("version", "0.0.0")
+        return settings.version_file.get("version", "0.0.0")
     except FileNotFoundError:
         return "0.0.0"
-    except json.JSONDecodeError:
-        return "0.0.0"
 
 
-async def get(url, timeout=10) -> dict[str, Any]:
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            return await response.json()
+def set_local_version(version_name: str) -> None:
+    """将本地版本号立即写入 version.json，文件不存在或已损坏时新建"""
+    version = version_name.removeprefix("v")
+    if settings.version_file.set("version", version):
+        settings.version_file.flush()
+    else:
+        settings.version_file.replace({"version": version})
+
+
+async def get(url, timeout=10, ttl: float = METADATA_TTL, persist: bool = True) -> dict[str, Any]:
+    """获取 JSON 接口，使用条件请求和短时缓存，见 :class:`MetadataCache`"""
+    with span("get", "http", host=url_host(url)):
+        return await metadata_cache.get_json(url, timeout, ttl, persist)
+
+
+_prefetching: set[asyncio.Future] = set()
+
+
+def _version_url() -> str:
+    # 响应中含有 CDK 授权的下载链接，请求时需传入 persist=False，不写入磁盘缓存
+    return VERSION_URL.format(version=get_local_version(), cdk=settings.get_mirrorchyan_cdk(),
+                              channel=settings.get_channel())
+
+
+async def _prefetch_hash() -> None:
+    """版本信息显示有新版本时请求哈希清单，已是最新版本时不请求"""
+    from packaging import version
+    remote = ((await get(_version_url(), persist=False)).get("data") or {}).get("version_name") or ""
+    local = get_local_version()
+    try:
+        newer = version.parse(remote) > version.parse(local)
+    except version.InvalidVersion:
+        newer = remote.removeprefix("v") != local
+    if remote and newer:
+        await get(HASH_URL)
+
+
+def prefetch_metadata() -> asyncio.Future:
+    """在后台同时请求启动时需要的接口
+
+    并发请求版本信息、公告和 api.json，版本信息显示有新版本时再请求哈希清单。之后对同一链接调用 :func:`get`
+    （包括 :func:`get_remote_version`、:func:`hash_check`）时会等待已发出的请求或直接使用其结果。
+    各请求的错误由之后实际使用结果的调用处理，返回的 Future 不会抛出异常，可以不等待。
+
+    Returns:
+        asyncio.Future: 所有请求完成时完成
+    """
+    future = asyncio.gather(get(_version_url(), persist=False), get(ANNOUNCEMENT_URL), get(API_URL),
+                            _prefetch_hash(), return_exceptions=True)
+    # 事件循环只弱引用任务，保留引用直到请求完成
+    _prefetching.add(future)
+    future.add_done_callback(_prefetching.discard)
+    return future
 
 
 async def get_remote_version() -> VersionResponseBody:
@@ -79,107 +134,580 @@ async def get_remote_version() -> VersionResponseBody:
         asyncio.TimeoutError: 请求超时
         json.JSONDecodeError: JSON 解析错误
     """
-    data = await get(VERSION_URL.format(version=get_local_version(), cdk=settings.get_mirrorchyan_cdk(),
-                                          channel=settings.get_channel()))
+    data = await get(_version_url(), persist=False)
     return VersionResponseBody(code=data.get("code", 0), msg=data.get("msg"),
                                data=VersionResponseData(data.get("data")))
 
 
-async def download_file_async(url: str, timeout: int = 60, size_callback=None, progress_callback=None) -> None:
+@dataclasses.dataclass
+class DownloadState:
+    """断点续传状态，保存在 ``DOWNLOADING_FILE`` 中"""
+    url: str = ""
+    sha256: str = ""
+    etag: str = ""
+    last_modified: str = ""
+    total_size: int = 0
+    ranges: list[list[int]] = dataclasses.field(default_factory=list)
+    """ 已完成的字节区间（闭区间，按起点排序且互不相邻） """
+
+    @classmethod
+    def load(cls, url: str, sha256: str) -> "DownloadState | None":
+        """读取与本次下载匹配的续传状态
+
+        期望的 sha256 已知时以 sha256 判断是否为同一文件（代理、Mirror酱 的链接每次可能不同），
+        否则要求链接一致。
+
+        Returns:
+            DownloadState | None: 可续传时返回状态，否则返回 None
+        """
+        if not TEMP_DOWNLOAD_FILE.exists():
+            return None
+        try:
+            with open(DOWNLOADING_FILE, 'r', encoding='utf-8') as f:
+                state = cls(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+        if sha256 != "" and state.sha256 != sha256:
+            return None
+        if sha256 == "" and state.url != url:
+            return None
+        if state.total_size <= 0 or not state.missing():
+            return None
+        if state.validator() == "" and state.sha256 == "":
+            # 既无法让服务器确认文件未变，也无法在下载后校验，放弃续传
+            return None
+        return state
+
+    def save(self) -> None:
+        """原子地写入续传状态"""
+        temp_file = DOWNLOADING_FILE.with_suffix(".tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(dataclasses.asdict(self), f)
+        os.replace(temp_file, DOWNLOADING_FILE)
+
+    @staticmethod
+    def discard() -> None:
+        """删除续传状态"""
+        DOWNLOADING_FILE.unlink(missing_ok=True)
+
+    def validator(self) -> str:
+        """返回用于 If-Range 的校验值，弱 ETag 不能用于 If-Range"""
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def add(self, start: int, end: int) -> None:
+        """记录一个已写入的字节区间"""
+        self.ranges = add_range(self.ranges, start, end)
+
+    def completed_size(self) -> int:
+        return sum(e - s + 1 for s, e in self.ranges)
+
+    def missing(self) -> list[tuple[int, int]]:
+        """返回尚未下载的字节区间"""
+        gaps = []
+        position = 0
+        for s, e in self.ranges:
+            if s > position:
+                gaps.append((position, s - 1))
+            position = max(position, e + 1)
+        if position < self.total_size:
+            gaps.append((position, self.total_size - 1))
+        return gaps
+
+
+def _split_ranges(ranges: list[tuple[int, int]], segments: int) -> list[tuple[int, int]]:
+    """将待下载的字节区间切分为分段
+
+    Args:
+        ranges: 待下载的闭区间列表
+        segments: 期望的分段数
+
+    Returns:
+        list[tuple[int, int]]: 切分后的闭区间列表，每个分段不小于 ``SEGMENT_MIN_SIZE``（区间本身更小时除外）
+    """
+    total_size = sum(end - start + 1 for start, end in ranges)
+    step = max(SEGMENT_MIN_SIZE, -(-total_size // max(1, segments)))
+    result = []
+    for start, end in ranges:
+        for position in range(start, end + 1, step):
+            result.append((position, min(position + step - 1, end)))
+    return result
+
+
+async def _write_stream(response: aiohttp.ClientResponse, start: int, end: int | None, on_chunk) -> None:
+    """将响应体交给 on_chunk 写入文件的指定偏移处
+
+    Args:
+        response: HTTP 响应
+        start: 写入起始偏移
+        end: 写入结束偏移（闭区间），为 None 时写到响应结束
+        on_chunk: 异步回调，接收每个数据块的偏移和数据
+    """
+    position = start
+    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+        if end is not None:
+            chunk = chunk[:end + 1 - position]
+        if not chunk:
+            break
+        await on_chunk(position, chunk)
+        position += len(chunk)
+        if end is not None and position > end:
+            break
+    if end is not None and position <= end:
+        raise aiohttp.ClientPayloadError(f"分段 {start}-{end} 数据不完整，仅收到 {position - start} 字节")
+
+
+async def _download_range(url: str, start: int, end: int, on_chunk, semaphore: asyncio.Semaphore,
+                          timeout: aiohttp.ClientTimeout, if_range: str = "", on_response=None) -> None:
+    """使用 Range 请求下载一个分段，on_response 在开始读取响应体前调用，可以抛出异常放弃该分段"""
+    headers = {**HEADERS, "Range": f"bytes={start}-{end}"}
+    if if_range:
+        headers["If-Range"] = if_range
+    async with semaphore:
+        async with get_session().get(url, headers=headers, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise aiohttp.ClientPayloadError(f"服务器未返回分段内容，状态码: {response.status}")
+            if on_response:
+                on_response(response)
+            await _write_stream(response, start, end, on_chunk)
+
+
+def _content_range_total(response: aiohttp.ClientResponse) -> int:
+    """从 Content-Range 头中取出文件总大小，未知时返回 0"""
+    total = response.headers.get('content-range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else 0
+
+
+def _first_request_headers(state: DownloadState | None, segments: int) -> dict:
+    """第一个请求的请求头：续传时只请求第一个缺失的区间，分段下载时只请求第一个分段"""
+    if state is not None:
+        start, end = state.missing()[0]
+        headers = {**HEADERS, "Range": f"bytes={start}-{end}"}
+        if state.validator():
+            headers["If-Range"] = state.validator()
+        return headers
+    if segments > 1:
+        # 文件总大小从 Content-Range 得知，服务器不会多发送后续分段的数据
+        return {**HEADERS, "Range": f"bytes=0-{SEGMENT_MIN_SIZE - 1}"}
+    return HEADERS
+
+
+def _restart_segments(response: aiohttp.ClientResponse, state: DownloadState | None, segments: int) -> int:
+    """判断第一个响应是否需要丢弃已下载的部分重新下载
+
+    Returns:
+        int: 重新下载使用的分段数，无需重新下载时为 0
+    """
+    total = _content_range_total(response)
+    if state is not None and total not in (0, state.total_size):
+        logger.info("远程文件大小已变化，丢弃已下载的部分，重新下载")
+        return segments
+    if state is None and response.status == 206 and total == 0:
+        logger.info("服务器未返回文件总大小，改为单连接下载")
+        return 1
+    return 0
+
+
+def _new_download(response: aiohttp.ClientResponse, url: str, sha256: str,
+                  segments: int) -> tuple[DownloadState, list[tuple[int, int]], bool]:
+    """根据第一个响应创建下载状态并划分分段
+
+    Range 响应的 ``Content-Range`` 可以确认文件总大小；否则以 ``Content-Length`` 为准，确认前不记录续传状态。
+
+    Returns:
+        tuple[DownloadState, list[tuple[int, int]], bool]: 下载状态、待下载的分段（第一个分段复用该响应），
+        以及文件总大小是否已经确认
+    """
+    confirmed = response.status == 206
+    if confirmed:
+        total_size = _content_range_total(response)
+        first_end = min(SEGMENT_MIN_SIZE, total_size) - 1
+        ranges = [(0, first_end)] + _split_ranges([(first_end + 1, total_size - 1)], segments - 1)
+    else:
+        total_size = int(response.headers.get('content-length', 0))
+        ranges = [(0, total_size - 1)] if total_size > 0 else []
+        if segments > 1 and response.headers.get('accept-ranges', '').lower() == 'bytes':
+            ranges = _split_ranges(ranges, segments)
+    state = DownloadState(url=url, sha256=sha256, etag=response.headers.get('etag', ''),
+                          last_modified=response.headers.get('last-modified', ''), total_size=total_size)
+    return state, ranges, confirmed
+
+
+class _SegmentedDownload:
+    """将各分段的数据写入 ``TEMP_DOWNLOAD_FILE``，汇总进度并每秒保存一次续传状态"""
+
+    def __init__(self, state: DownloadState, confirmed: bool, resume: bool, progress_callback=None):
+        """
+        Args:
+            state: 下载状态，已下载的区间会随写入更新
+            confirmed: 文件总大小是否已由 Content-Range 确认，确认前不保存续传状态
+            resume: 是否在已有文件上继续写入
+            progress_callback: 进度回调函数，接收已下载字节数
+        """
+        self.state = state
+        self.confirmed = confirmed
+        self._progress_callback = progress_callback
+        self._downloaded = state.completed_size()
+        if progress_callback and self._downloaded:
+            progress_callback(self._downloaded)
+        self._last_save = time.monotonic()
+        self._saving = False
+        self._writer = FileWriter(TEMP_DOWNLOAD_FILE, state.total_size, resume=resume, written=state.ranges)
+
+    async def _save_state(self) -> None:
+        # 只记录写入线程确认已同步到磁盘的区间，断电后续传也不会把未落盘的数据当作已下载
+        written = await self._writer.flush()
+        dataclasses.replace(self.state, ranges=written).save()
+
+    def check_total(self, response: aiohttp.ClientResponse) -> None:
+        """检查分段响应的 Content-Range 中的文件总大小，一致时确认文件总大小"""
+        total = _content_range_total(response)
+        if total == 0:
+            return
+        if total != self.state.total_size:
+            raise aiohttp.ClientPayloadError(f"服务器返回的文件大小不一致: {total} != {self.state.total_size}")
+        self.confirmed = True
+
+    async def on_chunk(self, position: int, chunk: bytes) -> None:
+        await self._writer.write(position, chunk)
+        self._downloaded += len(chunk)
+        self.state.add(position, position + len(chunk) - 1)
+        if self.confirmed and not self._saving and time.monotonic() - self._last_save >= 1:
+            self._saving = True
+            try:
+                await self._save_state()
+            finally:
+                self._saving = False
+                self._last_save = time.monotonic()
+        # 调用进度回调函数
+        if self._progress_callback:
+            self._progress_callback(self._downloaded)
+
+    async def run(self, response: aiohttp.ClientResponse, ranges: list[tuple[int, int]], segments: int,
+                  timeout: aiohttp.ClientTimeout) -> str:
+        """下载所有分段，第一个分段复用 response，其余分段并发发出 Range 请求
+
+        Returns:
+            str: 文件的 sha256
+
+        Raises:
+            aiohttp.ClientError: 网络请求错误，已下载的部分会保留以便续传
+        """
+        tasks = []
+        start, end = ranges[0] if ranges else (0, None)
+        if len(ranges) > 1:
+            logger.info("服务器支持分段下载，使用 {} 个连接", min(len(ranges), segments))
+            # 重定向后的地址（如 GitHub 的签名链接）直接用于其余分段，避免重复跳转
+            real_url = str(response.url)
+            semaphore = asyncio.Semaphore(max(1, segments - 1))
+            tasks = [asyncio.create_task(_download_range(real_url, s, e, self.on_chunk, semaphore, timeout,
+                                                         self.state.validator(), self.check_total))
+                     for s, e in ranges[1:]]
+        try:
+            # 第一个分段复用当前响应，读到分段末尾即停止
+            await _write_stream(response, start, end, self.on_chunk)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._abort()
+            raise
+        return await self._writer.close()
+
+    async def _abort(self) -> None:
+        """关闭文件并保存续传状态，磁盘出错时放弃续传"""
+        try:
+            await self._writer.close(finish=False)
+            if self.confirmed:
+                self.state.save()
+        except OSError:
+            DownloadState.discard()
+
+
+async def download_file_async(url: str, timeout: int = 60, size_callback=None, progress_callback=None,
+                              segments: int = DOWNLOAD_SEGMENTS, sha256: str = "") -> str:
     """异步下载文件并支持进度回调
 
+    第一个请求只请求第一个分段，从 ``Content-Range`` 得知文件总大小，文件足够大时再并发发出多个 Range 请求
+    下载其余分段，各分段按偏移写入 ``TEMP_DOWNLOAD_FILE``；服务器不支持 Range 时退回单连接流式下载。
+    文件由 :class:`FileWriter` 在独立线程中写入，不会阻塞事件循环。
+
+    已完成的字节区间和 ETag/Last-Modified 会记录在 ``DOWNLOADING_FILE`` 中。下次下载同一文件时，
+    通过 ``Range``/``If-Range`` 只请求缺失的部分；服务器返回完整内容或文件总大小不同，说明文件已变化，
+    此时丢弃旧数据重新下载。``Content-Length`` 可能不可靠（例如截断响应的代理），
+    因此只有 Range 响应的 ``Content-Range`` 确认了文件总大小后才记录续传状态。
+
     Args:
         url: 下载链接
         timeout: 超时时间(秒)
         size_callback: 文件大小回调函数，接收总字节数
-        progress_callback: 进度回调函数，接收已下载字节数
+        progress_callback: 进度回调函数，接收已下载字节数（分段下载时为所有分段之和）
+        segments: 最大分段数，小于等于 1 时不分段
+        sha256: 期望的文件哈希，用于识别可续传的同一文件，未知时为空
+
+    Returns:
+        str: 下载过程中同步计算出的文件 sha256，无需下载后再读一遍文件
 
     Raises:
         aiohttp.ClientError: 网络请求错误
         asyncio.TimeoutError: 请求超时
     """
-    import aiohttp
-    import os
-
     # 确保temp目录存在
     os.makedirs(os.path.dirname(TEMP_DOWNLOAD_FILE), exist_ok=True)
     logger.info("开始下载文件: {}", url)
 
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-        async with session.get(url, headers=HEADERS) as response:
-            response.raise_for_status()
+    state = DownloadState.load(url, sha256)
+    if state is not None:
+        logger.info("检测到未完成的下载，已完成 {} / {} 字节，继续下载", state.completed_size(), state.total_size)
+
+    # 下载耗时与文件大小相关，超时只限制连接和两次读取之间的间隔
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    async with get_session().get(url, headers=_first_request_headers(state, segments),
+                                 timeout=client_timeout) as response:
+        response.raise_for_status()
+
+        if state is not None and response.status != 206:
+            logger.info("远程文件已变化，丢弃已下载的部分")
+            state = None
+        restart = _restart_segments(response, state, segments)
+        if restart:
+            response.close()
+            DownloadState.discard()
+            TEMP_DOWNLOAD_FILE.unlink(missing_ok=True)
+            return await download_file_async(url, timeout, size_callback, progress_callback, restart, sha256)
+
+        if state is None:
+            DownloadState.discard()
+            # 旧文件可能是更新包缓存的硬链接，先删除再写入，避免改动缓存中的文件
+            TEMP_DOWNLOAD_FILE.unlink(missing_ok=True)
+            state, ranges, confirmed = _new_download(response, url, sha256, segments)
+            resume = False
+        else:
+            ranges, confirmed, resume = _split_ranges(state.missing(), segments), True, True
+
+        if size_callback:
+            size_callback(state.total_size)
+        download = _SegmentedDownload(state, confirmed, resume, progress_callback)
+        digest = await download.run(response, ranges, segments, client_timeout)
+
+    DownloadState.discard()
+    return digest
+
+
+async def download_to_path(url: str, path: Path, sha256: str = "", timeout: int = 60, on_chunk=None) -> str:
+    """下载单个文件到指定路径
+
+    先写入目标旁边的临时文件，校验通过后原子地替换目标文件，下载失败不会留下损坏的目标文件。
+    请求时要求不压缩响应；服务器仍然压缩时，aiohttp 会自动解压，此时 ``Content-Length`` 是压缩后的大小，
+    不用于预分配和检查完整性，由哈希校验保证内容完整。
+
+    Args:
+        url: 下载链接
+        path: 目标路径
+        sha256: 期望的文件哈希，为空时不校验
+        timeout: 超时时间(秒)
+        on_chunk: 每收到一个数据块时调用，接收该块的字节数
+
+    Returns:
+        str: 文件的 sha256
 
-            # 获取文件总大小
+    Raises:
+        aiohttp.ClientError: 网络请求错误
+        asyncio.TimeoutError: 请求超时
+        ValueError: 文件哈希与期望值不符
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".download")
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    headers = {**HEADERS, "Accept-Encoding": "identity"}
+    async with get_session().get(url, headers=headers, timeout=client_timeout) as response:
+        response.raise_for_status()
+        total_size = 0
+        if 'content-encoding' not in response.headers:
             total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-            if size_callback:
-                size_callback(total_size)
+        writer = FileWriter(temp_path, total_size)
+        position = 0
+        try:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await writer.write(position, chunk)
+                position += len(chunk)
+                if on_chunk:
+                    on_chunk(len(chunk))
+            if total_size and position != total_size:
+                raise aiohttp.ClientPayloadError(f"{path.name} 数据不完整，仅收到 {position} / {total_size} 字节")
+        except BaseException:
+            await writer.close(finish=False)
+            temp_path.unlink(missing_ok=True)
+            raise
+        digest = await writer.close()
+    if sha256 and digest != sha256:
+        temp_path.unlink(missing_ok=True)
+        raise ValueError(f"{path.name} 哈希校验失败")
+    os.replace(temp_path, path)
+    return digest
+
+
+async def _probe(url: str, timeout: int) -> tuple[str, float, float]:
+    """请求文件开头的一小段，测量首字节时间和下载速度
+
+    Returns:
+        tuple[str, float, float]: 链接、首字节时间(秒)、下载速度(字节/秒)
+    """
+    started = time.monotonic()
+    headers = {**HEADERS, "Range": f"bytes=0-{PROBE_SIZE - 1}"}
+    async with get_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        ttfb = time.monotonic() - started
+        received = 0
+        async for chunk in response.content.iter_chunked(8192):
+            received += len(chunk)
+            if received >= PROBE_SIZE:
+                break
+    return url, ttfb, received / max(time.monotonic() - started - ttfb, 1e-6)
 
-            with open(TEMP_DOWNLOAD_FILE, 'wb') as f:
-                # 使用chunk_size为8192进行流式下载
-                async for chunk in response.content.iter_chunked(8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
 
-                        # 调用进度回调函数
-                        if progress_callback:
-                            progress_callback(downloaded_size)
+@traced(category="http")
+async def race_urls(urls: list[str], timeout: int = PROBE_TIMEOUT) -> list[str]:
+    """并发探测多个下载链接，选出最快的一个
+
+    同时向所有链接请求开头的 ``PROBE_SIZE`` 字节，最先完成的链接胜出，其余探测立即取消。
+
+    Args:
+        urls: 候选下载链接
+        timeout: 探测超时时间(秒)
+
+    Returns:
+        list[str]: 胜出的链接排在首位，其余保持原顺序作为后备；全部探测失败时原样返回
+    """
+    winner = None
+    tasks = [asyncio.create_task(_probe(url, timeout)) for url in urls]
+    try:
+        for future in asyncio.as_completed(tasks):
+            try:
+                winner, ttfb, speed = await future
+            except Exception as e:
+                logger.warning("代理测速失败: {!r}", e)
+                continue
+            logger.info("选用最快的下载链接: {} (首字节 {:.0f} ms, {:.2f} MB/s)", winner, ttfb * 1000,
+                        speed / 1024 / 1024)
+            break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if winner is None:
+        return urls
+    return [winner] + [url for url in urls if url != winner]
 
 
 async def download_update_async(version_data: VersionResponseData, timeout: int = 60, size_callback=None,
-                                progress_callback=None) -> None:
+                                progress_callback=None, race: bool = True) -> str:
     """异步下载更新文件并支持进度回调
 
+    版本信息给出了 sha256 且更新包缓存中有相同 sha256 的更新包时直接从缓存取出，不再下载；
+    下载完成且哈希与版本信息一致时加入缓存。通过代理下载时，哈希与版本信息不一致的链接会被放弃，改用下一个链接。
+
     Args:
         version_data: 版本响应数据
         timeout: 超时时间(秒)
         size_callback: 文件大小回调函数
         progress_callback: 进度回调函数
+        race: 通过代理下载时先并发测速，优先使用最快的代理，否则按配置顺序逐个尝试
+
+    Returns:
+        str: 下载文件的 sha256
 
     Raises:
         aiohttp.ClientError: 网络请求错误
         asyncio.TimeoutError: 请求超时
     """
+    cache = PackageCache.load()
+    sha256 = version_data.sha256
+    if sha256 and not DOWNLOADING_FILE.exists():
+        os.makedirs(os.path.dirname(TEMP_DOWNLOAD_FILE), exist_ok=True)
+        with span("package_cache_fetch"):
+            size = await asyncio.to_thread(cache.fetch, sha256, TEMP_DOWNLOAD_FILE)
+        if size >= 0:
+            logger.info("使用缓存的更新包: {}", sha256)
+            if size_callback:
+                size_callback(size)
+            if progress_callback:
+                progress_callback(size)
+            return sha256
+
+    digest = await _download_update(version_data, timeout, size_callback, progress_callback, race)
+    if version_data.sha256 and digest == version_data.sha256:
+        try:
+            await asyncio.to_thread(cache.add, TEMP_DOWNLOAD_FILE, digest)
+        except OSError as e:
+            logger.warning("无法缓存更新包: {}", e)
+    return digest
+
+
+async def _download_update(version_data: VersionResponseData, timeout: int, size_callback, progress_callback,
+                           race: bool) -> str:
     if version_data.url != "":
-        await download_file_async(version_data.url, timeout, size_callback, progress_callback)
+        with span("download_file", "http", host=url_host(version_data.url)):
+            return await download_file_async(version_data.url, timeout, size_callback, progress_callback,
+                                             sha256=version_data.sha256)
     else:
-        for proxy in settings.get_proxys():
+        urls = [proxy + GITHUB_URL.format(version=version_data.version_name) for proxy in settings.get_proxys()]
+        if race and len(urls) > 1:
+            urls = await race_urls(urls)
+        for url in urls:
             try:
-                await download_file_async(proxy + GITHUB_URL.format(version=version_data.version_name), timeout,
-                                          size_callback,
-                                          progress_callback)
-                return
+                with span("download_file", "http", host=url_host(url)):
+                    digest = await download_file_async(url, timeout,
+                                                       size_callback,
+                                                       progress_callback,
+                                                       sha256=version_data.sha256)
             except Exception as e:
                 logger.error(e)
                 continue
+            if version_data.sha256 and digest != version_data.sha256:
+                # 代理返回了损坏或被篡改的内容，丢弃后换下一个链接，不再续传这部分数据
+                logger.error("通过 {} 下载的更新包哈希校验失败，尝试下一个链接", url)
+                TEMP_DOWNLOAD_FILE.unlink(missing_ok=True)
+                DownloadState.discard()
+                continue
+            return digest
         raise Exception("所有代理均无法下载文件，请检查网络连接。")
 
 
 def hash_calculate(file_path, hash_algo=hashlib.sha256) -> str:
     """
-    计算文件的哈希值。
+    计算文件的哈希值，分块读取以避免一次性将整个文件读入内存。
     """
     try:
         with open(file_path, "rb") as f:
-            data = f.read()
-            return hash_algo(data).hexdigest()
+            hash_obj = hash_algo()
+            while block := f.read(HASH_BLOCK_SIZE):
+                hash_obj.update(block)
+            return hash_obj.hexdigest()
     except FileNotFoundError:
         return ""
 
 
-async def hash_check(version_data: VersionResponseData) -> bool:
+@traced()
+async def hash_check(version_data: VersionResponseData, digest: str = "") -> bool:
     """
     检查文件的哈希值是否与预期值匹配。
+
+    Args:
+        version_data: 版本响应数据
+        digest: 下载时已计算出的哈希，为空时从磁盘读取文件计算
     """
+    if DOWNLOADING_FILE.exists():
+        # 仍有未完成的分段，文件不完整
+        return False
     sha256 = version_data.sha256
     if sha256 == "":
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-            async with session.get(API_URL) as response:
-                response.raise_for_status()
-                data = await response.json()
-                sha256 = data.get("sha256", "")
-    return sha256 == hash_calculate(TEMP_DOWNLOAD_FILE)
+        data = await get(API_URL, timeout=20)
+        sha256 = data.get("sha256", "")
+    return sha256 == (digest or hash_calculate(TEMP_DOWNLOAD_FILE))
 
 
 import psutil
@@ -200,16 +728,64 @@ class Castorice:
     你要呵护世间魂灵的恸哭，拥抱命运的孤独——生死皆为旅途，当蝴蝶停落枝头，那凋零的又将新生。
     """
 
+    @staticmethod
+    def snapshot() -> dict[str, list[psutil.Process]]:
+        """获取当前进程的快照
+
+        只遍历一次进程列表，并预先取得进程名，避免逐个进程调用 ``name()``。
+
+        Returns:
+            dict[str, list[psutil.Process]]: 小写进程名 → 同名的进程
+        """
+        index = {}
+        for proc in psutil.process_iter(['name']):
+            name = proc.info['name']
+            if name:
+                index.setdefault(name.lower(), []).append(proc)
+        return index
+
+    @staticmethod
+    def find(process_name: str) -> list[psutil.Process]:
+        """查找指定名称的所有进程（不区分大小写）"""
+        return Castorice.snapshot().get(process_name.lower(), [])
+
+    @staticmethod
+    @traced("terminate_process")
+    async def terminate(processes: list[psutil.Process], timeout: float = PROCESS_EXIT_TIMEOUT) -> None:
+        """结束进程并等待它们退出
+
+        先请求所有进程退出，在线程中等待；超时仍未退出的进程强制结束。
+
+        Args:
+            processes: 要结束的进程
+            timeout: 等待进程正常退出的时间(秒)
+        """
+        for proc in processes:
+            try:
+                proc.terminate()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        _, alive = await asyncio.to_thread(psutil.wait_procs, processes, timeout)
+        if not alive:
+            return
+        for proc in alive:
+            logger.warning("进程 {} 未在 {} 秒内退出，强制结束", proc.pid, timeout)
+            try:
+                proc.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        _, alive = await asyncio.to_thread(psutil.wait_procs, alive, timeout)
+        for proc in alive:
+            logger.error("无法结束进程 {}", proc.pid)
+
     @staticmethod
     def touch(process: str | int) -> None:
         """ 触摸一个进程 """
         try:
             if isinstance(process, str):
-                for p in psutil.process_iter():
-                    if p.name() == process:
-                        _process = psutil.Process(p.pid)
-                        _process.kill()
-                        return
+                processes = Castorice.find(process)
+                if processes:
+                    processes[0].kill()
             else:
                 _process = psutil.Process(process)
                 _process.kill()
@@ -226,15 +802,8 @@ class Castorice:
         Returns:
             True if the process is running, otherwise False.
         """
-        # Iterate over all running processes
-        for proc in psutil.process_iter(['name']):
-            try:
-                # Check if process name contains the given name string
-                if process_name.lower() in proc.info['name'].lower():
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-        return False
+        process_name = process_name.lower()
+        return any(process_name in name for name in Castorice.snapshot())
 
     @staticmethod
     def life(path: str, shell=False) -> bool:
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+from pathlib import Path
+
+from src.const import HASH_BLOCK_SIZE, WRITE_BUFFER_SIZE, WRITE_QUEUE_SIZE
+
+
+def add_range(ranges: list[list[int]], start: int, end: int) -> list[list[int]]:
+    """将闭区间 [start, end] 并入按起点排序的区间列表
+
+    Returns:
+        list[list[int]]: 合并后的新列表，相邻或重叠的区间会合并为一个
+    """
+    merged = []
+    for s, e in sorted(ranges + [[start, end]]):
+        if merged and s <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+def covers(ranges: list[list[int]], start: int, end: int) -> bool:
+    """判断闭区间 [start, end] 是否完全落在区间列表内"""
+    return any(s <= start and e >= end for s, e in ranges)
+
+
+def _preallocate(f, size: int) -> None:
+    """预先分配文件空间，减少写入过程中的碎片和文件系统元数据更新"""
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass
+    f.truncate(size)
+
+
+class _StreamingHasher:
+    """边写入边计算 sha256
+
+    sha256 只能按顺序计算：紧接在已计算部分之后写入的数据块直接参与计算，
+    分段下载时靠后的分段先写入的数据、以及续传前已下载的数据，则在轮到它们时从文件中分块补读。
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.sha256()
+        self.offset = 0
+        """ 已参与计算的字节数 """
+
+    def update(self, position: int, chunk: bytes, written: list[list[int]]) -> None:
+        if position > self.offset and covers(written, self.offset, position - 1):
+            self._read_until(position)
+        if position == self.offset:
+            self._hash.update(chunk)
+            self.offset += len(chunk)
+
+    def _read_until(self, end: int) -> None:
+        self._f.seek(self.offset)
+        while self.offset < end:
+            block = self._f.read(min(HASH_BLOCK_SIZE, end - self.offset))
+            if not block:
+                break
+            self._hash.update(block)
+            self.offset += len(block)
+
+    def hexdigest(self, total_size: int) -> str:
+        self._read_until(total_size)
+        return self._hash.hexdigest()
+
+
+_CLOSE = object()
+_ABORT = object()
+
+
+class FileWriter:
+    """在独立线程中写入下载文件
+
+    网络读取在事件循环中进行，磁盘写入交给专用线程，二者并行且写文件不会阻塞界面。
+    同一位置连续写入的小数据块会合并成 ``WRITE_BUFFER_SIZE`` 大小的块再写入，
+    队列中最多积压 ``WRITE_QUEUE_SIZE`` 个块，磁盘跟不上时 :meth:`write` 会等待。
+    写入线程同时计算文件的 sha256，见 :class:`_StreamingHasher`。
+
+    必须在事件循环中创建，并且最终调用 :meth:`close`。
+    """
+
+    def __init__(self, path: Path, total_size: int = 0, resume: bool = False,
+                 written: list[list[int]] | None = None):
+        """
+        Args:
+            path: 文件路径
+            total_size: 文件总字节数，已知时新文件会预先分配空间
+            resume: 是否在已有文件上继续写入，否则截断文件
+            written: 续传时文件中已有数据的字节区间
+        """
+        self._path = path
+        self._total_size = total_size
+        self._resume = resume
+        self._written = [r[:] for r in written or []]
+        """ 已写入磁盘的字节区间，仅由写入线程访问 """
+        self._buffers: dict[int, tuple[int, bytearray]] = {}
+        """ 待合并的数据块，键为数据块的结束偏移，值为 (起始偏移, 数据) """
+        self._queue = queue.SimpleQueue()
+        self._slots = asyncio.Semaphore(WRITE_QUEUE_SIZE)
+        self._putting: set[asyncio.Future] = set()
+        """ 正在等待队列空位的数据块，放入队列后完成 """
+        self._loop = asyncio.get_running_loop()
+        self._error: OSError | None = None
+        self.digest = ""
+        """ 文件的 sha256，调用 close() 后可用 """
+        self._thread = threading.Thread(target=self._run, name="FileWriter", daemon=True)
+        self._thread.start()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    async def write(self, position: int, chunk: bytes) -> None:
+        """在指定偏移处写入数据
+
+        Raises:
+            OSError: 写入线程发生的磁盘错误
+        """
+        self._raise_error()
+        start, data = self._buffers.pop(position, (position, bytearray()))
+        data += chunk
+        if len(data) >= WRITE_BUFFER_SIZE:
+            await self._put(start, data)
+        else:
+            self._buffers[start + len(data)] = (start, data)
+
+    async def _put(self, start: int, data: bytearray) -> None:
+        done = self._loop.create_future()
+        self._putting.add(done)
+        try:
+            await self._slots.acquire()
+            self._queue.put((start, data))
+        finally:
+            self._putting.discard(done)
+            done.set_result(None)
+
+    async def _drain_buffers(self) -> None:
+        while self._buffers:
+            _, (start, data) = self._buffers.popitem()
+            await self._put(start, data)
+
+    async def flush(self) -> list[list[int]]:
+        """等待此前写入的所有数据写入文件并同步到磁盘
+
+        包括其他协程中正在等待队列空位的数据块。
+
+        Returns:
+            list[list[int]]: 同步到磁盘时文件中已写入数据的字节区间，可以安全地记录为续传进度
+
+        Raises:
+            OSError: 写入线程发生的磁盘错误
+        """
+        await self._drain_buffers()
+        if self._putting:
+            await asyncio.wait(list(self._putting))
+        future = self._loop.create_future()
+        self._queue.put(future)
+        written = await future
+        self._raise_error()
+        return written
+
+    async def close(self, finish: bool = True) -> str:
+        """写完剩余数据并关闭文件
+
+        Args:
+            finish: 文件是否已完整下载，为 False 时不计算哈希
+
+        Returns:
+            str: 文件的 sha256，未完整下载时为空
+
+        Raises:
+            OSError: 写入线程发生的磁盘错误
+        """
+        await self._drain_buffers()
+        self._queue.put(_CLOSE if finish else _ABORT)
+        await asyncio.to_thread(self._thread.join)
+        self._raise_error()
+        return self.digest
+
+    def _resolve(self, future: asyncio.Future, result=None) -> None:
+        if not future.done():
+            future.set_result(result)
+
+    def _open(self):
+        """打开文件，新文件预先分配空间，失败时记录错误并返回 None"""
+        try:
+            f = open(self._path, 'r+b' if self._resume else 'w+b')
+            if not self._resume and self._total_size > 0:
+                _preallocate(f, self._total_size)
+            return f
+        except OSError as e:
+            self._error = e
+            return None
+
+    def _sync(self, f) -> list[list[int]]:
+        """将已写入的数据同步到磁盘，返回同步前已写入的字节区间"""
+        written = [r[:] for r in self._written]
+        if self._error is None:
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError as e:
+                self._error = e
+        return written
+
+    def _write(self, f, hasher: _StreamingHasher, start: int, data: bytearray) -> None:
+        if self._error is not None:
+            return
+        try:
+            f.seek(start)
+            f.write(data)
+            self._written = add_range(self._written, start, start + len(data) - 1)
+            hasher.update(start, data, self._written)
+        except OSError as e:
+            self._error = e
+
+    def _run(self) -> None:
+        f = self._open()
+        hasher = _StreamingHasher(f) if f is not None else None
+
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE or item is _ABORT:
+                break
+            if isinstance(item, asyncio.Future):
+                self._loop.call_soon_threadsafe(self._resolve, item, self._sync(f))
+                continue
+            self._write(f, hasher, *item)
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+        if f is None:
+            return
+        try:
+            if item is _CLOSE and self._error is None:
+                self.digest = hasher.hexdigest(self._total_size)
+        except OSError as e:
+            self._error = e
+        finally:
+            f.close()